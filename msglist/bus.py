@@ -0,0 +1,192 @@
+"""Room pub/sub between ws_server.py worker processes.
+
+With `ws_server.py --workers N` the parent process runs a Broker on a Unix
+domain socket and every worker connects a BusClient to it. A worker
+subscribes to a room when the room gets its first local member and
+unsubscribes when the last one leaves; a message published to some rooms
+goes only to the workers subscribed to any of them. The broker numbers
+messages, so every client sees one order and one sequence, whichever
+worker it is connected to. A single-process server uses LocalBus, which
+numbers and delivers in place. Whichever of the two numbers messages also
+writes them to the message log, if there is one (see history.py).
+
+Bus frames are a 4-byte big-endian length, a type byte and a body:
+
+    SUB/UNSUB   room (UTF-8)
+    PUB         sender id (8 bytes), rooms, payload
+    MSG         seq (8 bytes), sender id (8 bytes), rooms, payload
+
+where rooms is a 2-byte count followed by 2-byte-length-prefixed names.
+ws_server.py keeps the rooms of a client, and so of any one message, to
+MAX_ROOMS.
+"""
+
+import abc
+import asyncio
+import struct
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+SUB, UNSUB, PUB, MSG = range(4)
+
+HEADER = struct.Struct("!IB")
+ID = struct.Struct("!Q")
+SEQ_ID = struct.Struct("!QQ")
+COUNT = struct.Struct("!H")
+# Most rooms a message can be published to; a client may be in at most this many
+MAX_ROOMS = 1024
+
+# deliver(rooms, sender, seq, payload)
+Deliver = Callable[[List[str], int, int, bytes], None]
+
+def _frame(kind: int, body: bytes) -> bytes:
+    return HEADER.pack(len(body) + 1, kind) + body
+
+def pack_rooms(rooms: Iterable[str]) -> bytes:
+    names = [room.encode("utf-8") for room in rooms]
+    return COUNT.pack(len(names)) + b"".join(COUNT.pack(len(name)) + name for name in names)
+
+def unpack_rooms(body: bytes, pos: int) -> Tuple[List[str], int]:
+    (count,) = COUNT.unpack_from(body, pos)
+    pos += COUNT.size
+    rooms = []
+    for _ in range(count):
+        (length,) = COUNT.unpack_from(body, pos)
+        pos += COUNT.size
+        rooms.append(body[pos:pos + length].decode("utf-8"))
+        pos += length
+    return rooms, pos
+
+class FrameReader(asyncio.Protocol, abc.ABC):
+    """Splits the byte stream of a bus connection into (type, body) frames."""
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.buffer = bytearray()
+
+    def data_received(self, data: bytes):
+        buffer = self.buffer
+        buffer += data
+        pos = 0
+        while len(buffer) - pos >= HEADER.size:
+            length, kind = HEADER.unpack_from(buffer, pos)
+            end = pos + 4 + length
+            if end > len(buffer):
+                break
+            self.frame_received(kind, bytes(buffer[pos + HEADER.size:end]))
+            pos = end
+        del buffer[:pos]
+
+    @abc.abstractmethod
+    def frame_received(self, kind: int, body: bytes):
+        """Handle one complete frame."""
+
+class LocalBus:
+    """The bus of a single-process server: numbers messages and delivers them at once."""
+
+    def __init__(self, deliver: Deliver, log=None):
+        self.deliver = deliver
+        self.log = log
+        self.seq = log.last_seq() if log is not None else 0
+
+    def subscribe(self, room: str):
+        pass
+
+    def unsubscribe(self, room: str):
+        pass
+
+    def publish(self, rooms: Iterable[str], sender: int, payload: bytes):
+        self.seq += 1
+        rooms = list(rooms)
+        if self.log is not None:
+            self.log.append(self.seq, sender, rooms, payload)
+        self.deliver(rooms, sender, self.seq, payload)
+
+class BusClient(FrameReader):
+    """A worker's connection to the Broker."""
+
+    def __init__(self, deliver: Deliver):
+        self.deliver = deliver
+        self.seq = 0  # last sequence number delivered
+        # Resolved when the broker goes away; the worker cannot reach the others then
+        self.lost = asyncio.get_running_loop().create_future()
+
+    @classmethod
+    async def connect(cls, path: str, deliver: Deliver) -> "BusClient":
+        _, client = await asyncio.get_running_loop().create_unix_connection(lambda: cls(deliver), path)
+        return client
+
+    def connection_lost(self, exc):
+        if not self.lost.done():
+            self.lost.set_result(exc)
+
+    def subscribe(self, room: str):
+        self.transport.write(_frame(SUB, room.encode("utf-8")))
+
+    def unsubscribe(self, room: str):
+        self.transport.write(_frame(UNSUB, room.encode("utf-8")))
+
+    def publish(self, rooms: Iterable[str], sender: int, payload: bytes):
+        self.transport.write(_frame(PUB, ID.pack(sender) + pack_rooms(rooms) + payload))
+
+    def frame_received(self, kind: int, body: bytes):
+        if kind == MSG:
+            self.seq, sender = SEQ_ID.unpack_from(body)
+            rooms, pos = unpack_rooms(body, SEQ_ID.size)
+            self.deliver(rooms, sender, self.seq, body[pos:])
+
+class Broker:
+    """Forwards published messages to the workers subscribed to their rooms."""
+
+    def __init__(self, log=None):
+        self.subscribers: Dict[str, Set["BrokerConnection"]] = {}
+        self.log = log
+        self.seq = log.last_seq() if log is not None else 0
+
+    async def serve(self, path: str):
+        return await asyncio.get_running_loop().create_unix_server(lambda: BrokerConnection(self), path)
+
+    def subscribe(self, connection: "BrokerConnection", room: str):
+        self.subscribers.setdefault(room, set()).add(connection)
+        connection.rooms.add(room)
+
+    def unsubscribe(self, connection: "BrokerConnection", room: str):
+        connection.rooms.discard(room)
+        subscribers = self.subscribers.get(room)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self.subscribers[room]
+
+    def publish(self, body: bytes):
+        """Number a PUB body and send it once to every subscribed worker."""
+        rooms, pos = unpack_rooms(body, ID.size)
+        if len(rooms) == 1:
+            targets = self.subscribers.get(rooms[0], ())
+        else:
+            targets = set().union(*(self.subscribers.get(room, ()) for room in rooms))
+        self.seq += 1
+        if self.log is not None:
+            (sender,) = ID.unpack_from(body)
+            self.log.append(self.seq, sender, rooms, body[pos:])
+        frame = _frame(MSG, ID.pack(self.seq) + body)
+        for connection in targets:
+            connection.transport.write(frame)
+
+class BrokerConnection(FrameReader):
+    """The broker's end of one worker's connection."""
+
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.rooms: Set[str] = set()
+
+    def frame_received(self, kind: int, body: bytes):
+        if kind == PUB:
+            self.broker.publish(body)
+        elif kind == SUB:
+            self.broker.subscribe(self, body.decode("utf-8"))
+        elif kind == UNSUB:
+            self.broker.unsubscribe(self, body.decode("utf-8"))
+
+    def connection_lost(self, exc):
+        for room in list(self.rooms):
+            self.broker.unsubscribe(self, room)
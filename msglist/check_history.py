@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Check of ws_server.py message history: ring replay and log catch-up.
+
+1. With --log, a client joining a room late gets the room's recent
+   messages, and nothing from other rooms.
+2. After a server restart, a client reconnecting with ?since=N gets
+   exactly the messages after seq N, across the restart, from the log.
+3. Catching up the last few messages of a long log costs about the same
+   as in a short one, and far less than reading the whole log.
+
+Exits 0 when all three hold. Run it with --workers 2 to test the sharded
+server, where the broker writes the log and workers read it.
+
+    python check_history.py
+    python check_history.py --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+import websockets
+import frames
+import history
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def start_server(args, log: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.join(HERE, "ws_server.py"), "--port", str(args.port),
+                             "--workers", str(args.workers), "--log", log], stdout=subprocess.DEVNULL)
+
+def stop_server(server: subprocess.Popen):
+    server.send_signal(signal.SIGINT)
+    server.wait(10)
+
+async def connect(uri: str):
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            return await websockets.connect(uri, subprotocols=[frames.SUBPROTOCOL_BINARY])
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def receive_all(websocket, quiet: float = 0.5) -> List[Tuple[int, int, bytes]]:
+    """Frames until none arrives for `quiet` seconds."""
+    received = []
+    try:
+        while True:
+            received.append(frames.decode(await asyncio.wait_for(websocket.recv(), quiet)))
+    except asyncio.TimeoutError:
+        return received
+
+async def type_text(websocket, text: str):
+    for seq, char in enumerate(text, 1):
+        await websocket.send(frames.encode_binary(0, seq, char.encode()))
+        await asyncio.sleep(0.02)  # slower than the coalescing window, like typing
+
+def text_of(received) -> str:
+    return b"".join(payload for _, _, payload in received).decode()
+
+async def check_server(args, log: str) -> bool:
+    uri = f"ws://localhost:{args.port}"
+    ok = True
+    server = start_server(args, log)
+    try:
+        writer = await connect(f"{uri}/room")
+        other = await connect(f"{uri}/other")
+        await type_text(writer, "hello")
+        await type_text(other, "elsewhere")
+        await asyncio.sleep(0.3)
+
+        late = await connect(f"{uri}/room")
+        replayed = await receive_all(late)
+        print(f"late joiner: {text_of(replayed)!r} in {len(replayed)} frames")
+        if text_of(replayed) != "hello":
+            ok = False
+        seen = max(seq for _, seq, _ in replayed) if replayed else 0
+        await late.close()
+
+        await type_text(writer, " world")
+        await asyncio.sleep(0.3)
+        await writer.close()
+        await other.close()
+    finally:
+        stop_server(server)
+
+    server = start_server(args, log)
+    try:
+        writer = await connect(f"{uri}/room")
+        await receive_all(writer)
+        await type_text(writer, "!")
+        await asyncio.sleep(0.3)
+        back = await connect(f"{uri}/room?since={seen}")
+        caught_up = await receive_all(back)
+        print(f"reconnected after restart since seq {seen}: {text_of(caught_up)!r}, "
+              f"seqs {[seq for _, seq, _ in caught_up]}")
+        if text_of(caught_up) != " world!" or any(seq <= seen for _, seq, _ in caught_up):
+            ok = False
+        await back.close()
+        await writer.close()
+    finally:
+        stop_server(server)
+    return ok
+
+def time_catch_up(reader: history.LogReader, behind: int, repeat: int = 200) -> float:
+    """Seconds to read the last `behind` messages of a log."""
+    since = reader.last_seq() - behind
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for _ in reader.since(since):
+            pass
+    return (time.perf_counter() - started) / repeat
+
+def check_seek(args, directory: str) -> bool:
+    times = {}
+    for records in (1000, args.records):
+        log = history.MessageLog(os.path.join(directory, f"seek-{records}.log"))
+        for seq in range(1, records + 1):
+            log.append(seq, seq % 7, ("room",), b"some typing")
+        log.close()
+        reader = history.LogReader(log.path)
+        times[records] = time_catch_up(reader, 10)
+    started = time.perf_counter()
+    full = sum(1 for _ in reader.since(0))
+    scan = time.perf_counter() - started
+    short, long = times[1000], times[args.records]
+    print(f"last 10 of 1000 messages: {short * 1e6:.1f} us; of {full}: {long * 1e6:.1f} us; "
+          f"reading all {full}: {scan * 1e3:.1f} ms")
+    return long < 10 * short and long < scan / 100
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the message history of ws_server.py.")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8798)
+    parser.add_argument("--records", type=int, default=500000, help="messages in the long log")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        ok = asyncio.run(check_server(args, os.path.join(directory, "messages.log")))
+        ok = check_seek(args, directory) and ok
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
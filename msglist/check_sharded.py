@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""End-to-end check of ws_server.py --workers.
+
+Starts the server with several worker processes, connects --clients clients
+to one room and a few to another, and has each client in the first room
+type a tag of its own. Passes (exit status 0) when every client in the
+room received every other client's tag exactly once, the senders were
+spread over at least two workers, and nothing leaked into the other room.
+
+    python check_sharded.py --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict
+import websockets
+import frames
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+async def wait_for_port(uri: str, deadline: float):
+    while True:
+        try:
+            async with websockets.connect(uri):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+class Client:
+    """Collects what each sender typed, by sender id."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.heard: Dict[int, bytes] = {}
+
+    async def run(self):
+        try:
+            async for message in self.websocket:
+                sender, _, payload = frames.decode(message)
+                self.heard[sender] = self.heard.get(sender, b"") + payload
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+async def check(args) -> bool:
+    uri = f"ws://localhost:{args.port}"
+    await wait_for_port(uri, time.monotonic() + 10)
+    # Even and odd clients speak different wire formats
+    sockets = [await websockets.connect(f"{uri}/shared", subprotocols=[frames.SUBPROTOCOLS[i % 2]])
+               for i in range(args.clients)]
+    outsiders = [await websockets.connect(f"{uri}/elsewhere") for _ in range(args.outsiders)]
+    clients = [Client(websocket) for websocket in sockets + outsiders]
+    tasks = [asyncio.create_task(client.run()) for client in clients]
+    await asyncio.sleep(0.5)  # let every worker subscribe
+
+    tags = [f"tag-{i}-é|".encode() for i in range(args.clients)]
+    for websocket, tag in zip(sockets, tags):
+        encode = frames.encoder(websocket.subprotocol)
+        # Send the tag in pieces, as typing would
+        for seq, piece in enumerate((tag[:4], tag[4:]), 1):
+            await websocket.send(encode(0, seq, piece))
+    await asyncio.sleep(args.settle)
+
+    # Sender id of each client, as the others saw it
+    ids = {}
+    for client in clients[:args.clients]:
+        for sender, text in client.heard.items():
+            if text in tags:
+                ids[tags.index(text)] = sender
+    workers = {(sender - 1) % args.workers for sender in ids.values()}
+    ok = True
+    for index, client in enumerate(clients[:args.clients]):
+        expected = {ids.get(other): tags[other] for other in range(args.clients) if other != index}
+        if client.heard != expected:
+            missing = len(set(expected.items()) - set(client.heard.items()))
+            print(f"client {index}: heard {len(client.heard)} senders, {missing} tags missing or wrong")
+            ok = False
+    leaked = sum(len(client.heard) for client in clients[args.clients:])
+    print(f"{args.clients} clients on {len(workers)} of {args.workers} workers, "
+          f"{len(ids)} senders identified, {leaked} leaked into the other room")
+    if len(ids) != args.clients or len(workers) < 2 or leaked:
+        ok = False
+
+    for task in tasks:
+        task.cancel()
+    for client in clients:
+        await client.websocket.close()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that ws_server.py --workers delivers across processes.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--outsiders", type=int, default=4, help="clients in another room")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait for deliveries")
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, "ws_server.py"),
+                               "--port", str(args.port), "--workers", str(args.workers)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        ok = asyncio.run(check(args))
+    finally:
+        server.send_signal(signal.SIGINT)  # lets it stop the workers and remove the bus socket
+        server.wait(10)
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
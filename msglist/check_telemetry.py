@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Check of the ws_server.py telemetry.
+
+Starts the server with --telemetry-interval and --telemetry-port, has one
+of --clients clients type --messages characters and scrapes /metrics.
+Passes (exit status 0) when the frame counters match what was sent and
+received, every client has a queue depth, the loop lag was sampled, the
+summary line was logged, and frames were logged only at --log-level debug.
+
+    python check_telemetry.py
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from typing import Dict
+import websockets
+import frames
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def scrape(port: int) -> Dict[str, float]:
+    """Samples of /metrics by name and labels."""
+    body = urllib.request.urlopen(f"http://localhost:{port}/metrics", timeout=5).read().decode()
+    return {match.group(1): float(match.group(2))
+            for match in re.finditer(r"^(msglist_\S+) (\S+)$", body, re.MULTILINE)}
+
+async def exercise(args) -> Dict[str, float]:
+    uri = f"ws://localhost:{args.port}"
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            clients = [await websockets.connect(uri, subprotocols=[frames.SUBPROTOCOL_BINARY])
+                       for _ in range(args.clients)]
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+    for seq in range(args.messages):
+        await clients[0].send(frames.encode_binary(0, seq, b"x"))
+    # Every other client reads what was typed
+    for client in clients[1:]:
+        for _ in range(args.messages):
+            await client.recv()
+    await asyncio.sleep(args.interval * 1.5)  # a summary line covering the typing
+    metrics = await asyncio.to_thread(scrape, args.telemetry_port)
+    for client in clients:
+        await client.close()
+    return metrics
+
+def run(args, level: str, output: str) -> Dict[str, float]:
+    with open(output, "w") as log:
+        server = subprocess.Popen([sys.executable, os.path.join(HERE, "ws_server.py"), "--port", str(args.port),
+                                   "--coalesce-ms", "0", "--log-level", level,
+                                   "--telemetry-interval", str(args.interval),
+                                   "--telemetry-port", str(args.telemetry_port)],
+                                  stdout=log, stderr=subprocess.STDOUT)
+        try:
+            return asyncio.run(exercise(args))
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait(10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the telemetry of ws_server.py.")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=1)
+    parser.add_argument("--port", type=int, default=8796)
+    parser.add_argument("--telemetry-port", type=int, default=9796)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        quiet_log, debug_log = os.path.join(directory, "info.log"), os.path.join(directory, "debug.log")
+        metrics = run(args, "info", quiet_log)
+        run(args, "debug", debug_log)
+        with open(quiet_log) as log:
+            quiet = log.read()
+        with open(debug_log) as log:
+            logged_frames = log.read().count("Received ")
+
+    checks = {
+        "frames received": metrics["msglist_frames_received_total"] == args.messages,
+        "frames sent": metrics["msglist_frames_sent_total"] == args.messages * (args.clients - 1),
+        "queue depth per client": sum(name.startswith("msglist_client_queue_depth{") for name in metrics)
+                                  == args.clients,
+        "loop lag sampled": metrics['msglist_loop_lag_histogram_seconds_bucket{le="+Inf"}'] > 0,
+        "tasks counted": metrics["msglist_tasks"] > args.clients,
+        "summary line": f"{args.clients} clients" in quiet and "frames/s" in quiet,
+        "frames not logged at info": "Received " not in quiet,
+        "frames logged at debug": logged_frames == args.messages,
+    }
+    for check, passed in checks.items():
+        print(f"{check:>26}: {'ok' if passed else 'FAILED'}")
+    ok = all(checks.values())
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Wire formats of the msglist WebSocket protocol.
+
+Every frame carries some typed text (UTF-8), the id the server gave its
+sender and a sequence number. Two encodings exist, chosen with the
+WebSocket subprotocol:
+
+- msglist.bin.v1: a binary frame of two unsigned LEB128 varints, sender id
+  then sequence number, followed by the UTF-8 text. A keystroke costs 3-4
+  bytes of overhead.
+- msglist.json.v1, or no subprotocol at all: a text frame
+  {"text": ..., "char": ..., "sender": ..., "seq": ...}, where "char"
+  repeats "text" for clients that predate it. Older clients send only
+  {"text": ...} or {"char": ...}.
+
+Clients set sender and seq as they like (0 and their own counter); the
+server replaces both before passing a frame on.
+
+Joining and leaving rooms are JSON text frames under either subprotocol:
+{"join": "room"} and {"leave": "room"}.
+"""
+
+import json
+from typing import Optional, Sequence, Tuple, Union
+
+SUBPROTOCOL_BINARY = "msglist.bin.v1"
+SUBPROTOCOL_JSON = "msglist.json.v1"
+# In order of preference
+SUBPROTOCOLS = (SUBPROTOCOL_BINARY, SUBPROTOCOL_JSON)
+
+class FrameError(ValueError):
+    """A frame that does not follow the negotiated format."""
+
+class Control:
+    """A request to join or leave a room."""
+
+    JOIN = "join"
+    LEAVE = "leave"
+
+    def __init__(self, action: str, room: str):
+        self.action = action
+        self.room = room
+
+    def encode(self) -> str:
+        return json.dumps({self.action: self.room})
+
+def select_subprotocol(connection, offered: Sequence[str]) -> Optional[str]:
+    """Server-side negotiation: binary if offered, else JSON; no subprotocol is JSON too."""
+    for subprotocol in SUBPROTOCOLS:
+        if subprotocol in offered:
+            return subprotocol
+    return None
+
+def _varint(value: int) -> bytes:
+    if value < 0x80:
+        return bytes((value,))
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    try:
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result, pos
+            shift += 7
+            if shift > 63:
+                raise FrameError("varint longer than 64 bits")
+    except IndexError:
+        raise FrameError("truncated frame header") from None
+
+def encode_binary(sender: int, seq: int, payload: bytes) -> bytes:
+    return _varint(sender) + _varint(seq) + payload
+
+def decode_binary(frame: bytes) -> Tuple[int, int, bytes]:
+    """(sender, seq, UTF-8 payload) of a binary frame; the payload is not decoded."""
+    sender, pos = _read_varint(frame, 0)
+    seq, pos = _read_varint(frame, pos)
+    return sender, seq, frame[pos:]
+
+def encode_json(sender: int, seq: int, payload: bytes) -> str:
+    text = payload.decode('utf-8', errors='replace')
+    return json.dumps({'text': text, 'char': text, 'sender': sender, 'seq': seq})
+
+def decode_json(frame: Union[str, bytes]) -> Union[Tuple[int, int, bytes], Control]:
+    try:
+        data = json.loads(frame)
+        for action in (Control.JOIN, Control.LEAVE):
+            if action in data:
+                if not isinstance(data[action], str):
+                    raise TypeError(f"room must be a string, got {data[action]!r}")
+                return Control(action, data[action])
+        text = data.get('text', data.get('char', ''))
+        return int(data.get('sender', 0)), int(data.get('seq', 0)), text.encode('utf-8')
+    except (ValueError, AttributeError, TypeError) as e:
+        raise FrameError(f"invalid JSON frame: {e}") from None
+
+def encoder(subprotocol: Optional[str]):
+    """encode(sender, seq, payload) function for a negotiated subprotocol."""
+    return encode_binary if subprotocol == SUBPROTOCOL_BINARY else encode_json
+
+def decode(frame: Union[str, bytes]) -> Union[Tuple[int, int, bytes], Control]:
+    """(sender, seq, payload) of a frame in either format, or a Control; binary frames are binary."""
+    if isinstance(frame, str):
+        return decode_json(frame)
+    return decode_binary(frame)
@@ -0,0 +1,152 @@
+"""Message history of ws_server.py, for clients that join late or reconnect.
+
+HistoryRing holds the last `capacity` messages in memory: sequence numbers
+and sender ids in two preallocated arrays, rooms and payloads in two
+fixed-size lists, all indexed by one wrapping position.
+
+MessageLog appends every message to a file and, next to it (PATH.idx),
+the offset of each record. Sequence numbers in a log are consecutive, so
+the index is just the first sequence number followed by one 8-byte offset
+per message, and the record of seq N is at entry N - first. LogReader reads
+both files through mmap: catching up from seq N is one lookup in the index
+and a walk over the records after it, however long the log. A reopened log
+continues the numbering where it stopped.
+
+Each record is seq (8 bytes), sender id (8 bytes), payload length
+(4 bytes), the rooms as in bus.py, then the payload.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from typing import Iterator, List, Optional, Sequence, Tuple
+import bus
+
+RECORD = struct.Struct("!QQI")
+OFFSET = struct.Struct("!Q")
+
+# (seq, sender, rooms, payload)
+Message = Tuple[int, int, Sequence[str], bytes]
+
+class HistoryRing:
+    """The last `capacity` messages, oldest first."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.seqs = array("Q", bytes(8 * capacity))
+        self.senders = array("Q", bytes(8 * capacity))
+        self.rooms: List[Tuple[str, ...]] = [()] * capacity
+        self.payloads: List[bytes] = [b""] * capacity
+        self.start = 0  # position of the oldest message
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, seq: int, sender: int, rooms: Sequence[str], payload: bytes):
+        position = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.seqs[position] = seq
+        self.senders[position] = sender
+        # Runs of messages to the same rooms share one tuple
+        rooms = tuple(rooms)
+        last = self.rooms[position - 1]
+        self.rooms[position] = last if last == rooms else rooms
+        self.payloads[position] = payload
+
+    def since(self, seq: int) -> Iterator[Message]:
+        """Messages after `seq`, as far back as the ring goes."""
+        capacity, start = self.capacity, self.start
+        # Sequence numbers only grow, so the first one after `seq` is a binary search away
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.seqs[(start + middle) % capacity] <= seq:
+                low = middle + 1
+            else:
+                high = middle
+        for n in range(low, self.count):
+            position = (start + n) % capacity
+            yield self.seqs[position], self.senders[position], self.rooms[position], self.payloads[position]
+
+class LogReader:
+    """Read access to a MessageLog, possibly one another process is writing."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.data_map: Optional[mmap.mmap] = None
+        self.index_map: Optional[mmap.mmap] = None
+        self.first_seq = 0
+        self.count = 0
+
+    def _refresh(self):
+        """Map the files again if more records were indexed since the last look."""
+        size = os.path.getsize(self.index_path)
+        count = max(0, (size - OFFSET.size) // OFFSET.size)
+        if self.index_map is not None and count == self.count:
+            return
+        # The data is written before its index entry, so it is at least as complete
+        with open(self.path, "rb") as data, open(self.index_path, "rb") as index:
+            if size >= OFFSET.size:
+                self.index_map = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+                (self.first_seq,) = OFFSET.unpack_from(self.index_map)
+            if count:
+                self.data_map = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = count
+
+    def last_seq(self) -> int:
+        self._refresh()
+        return self.first_seq + self.count - 1 if self.index_map is not None else 0
+
+    def since(self, seq: int) -> Iterator[Message]:
+        """Messages after `seq` that are in the log."""
+        self._refresh()
+        first = max(seq + 1, self.first_seq)
+        end = self.first_seq + self.count
+        if first >= end:
+            return
+        data = self.data_map
+        (pos,) = OFFSET.unpack_from(self.index_map, OFFSET.size * (1 + first - self.first_seq))
+        for _ in range(end - first):
+            seq, sender, length = RECORD.unpack_from(data, pos)
+            rooms, pos = bus.unpack_rooms(data, pos + RECORD.size)
+            yield seq, sender, rooms, data[pos:pos + length]
+            pos += length
+
+class MessageLog(LogReader):
+    """An append-only message log and its offset index.
+
+    Writes go to the page cache without fsync; a record is visible to
+    readers once its index entry is written.
+    """
+
+    def __init__(self, path: str):
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+        self.data_fd = os.open(path, flags, 0o644)
+        self.index_fd = os.open(path + ".idx", flags, 0o644)
+        # An entry cut short by a crash points nowhere; drop it
+        size = os.fstat(self.index_fd).st_size
+        if size % OFFSET.size:
+            os.ftruncate(self.index_fd, size - size % OFFSET.size)
+        self.has_first_seq = size >= OFFSET.size
+        self.data_size = os.fstat(self.data_fd).st_size
+        super().__init__(path)
+
+    def append(self, seq: int, sender: int, rooms: Sequence[str], payload: bytes):
+        """Add message `seq`, which must follow the last one."""
+        if not self.has_first_seq:
+            os.write(self.index_fd, OFFSET.pack(seq))
+            self.has_first_seq = True
+        record = RECORD.pack(seq, sender, len(payload)) + bus.pack_rooms(rooms) + payload
+        os.write(self.data_fd, record)
+        os.write(self.index_fd, OFFSET.pack(self.data_size))
+        self.data_size += len(record)
+
+    def close(self):
+        os.close(self.data_fd)
+        os.close(self.index_fd)
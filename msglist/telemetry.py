@@ -0,0 +1,147 @@
+"""Opt-in telemetry of ws_server.py.
+
+Tracks event loop lag (how late a periodic wakeup runs compared to when it
+was scheduled), live asyncio tasks, the outbound queue of every client and
+frames and bytes in and out. It is reported two ways:
+
+- a summary line every `interval` seconds, with rates over that interval;
+- a scrape endpoint, http://host:port/metrics, in the Prometheus text
+  format: counters are totals, lag is a histogram.
+
+Under --workers every worker reports for itself; worker w serves its
+endpoint on port + w.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger("msglist")
+
+# Upper bounds of the loop lag histogram, in seconds
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+class Telemetry:
+    """Counters updated by the server, and the tasks that report them.
+
+    `queues` returns (client id, outbound queue depth) of every connected
+    client and `counters` the throttle counters; both are read only when
+    reporting.
+    """
+
+    def __init__(self, queues: Callable[[], Iterable[Tuple[int, int]]], counters: Dict[str, int],
+                 interval: float = 0, tick: float = 0.1):
+        self.queues = queues
+        self.counters = counters
+        self.interval = interval
+        self.tick = tick
+        self.frames_in = self.bytes_in = 0
+        self.frames_out = self.bytes_out = 0
+        self.lag = 0.0  # of the last wakeup
+        self.lag_max = 0.0  # since the last summary line
+        self.lag_buckets: List[int] = [0] * (len(LAG_BUCKETS) + 1)
+        self.lag_sum = 0.0
+        self.tasks: List[asyncio.Task] = []
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def received(self, frame):
+        self.frames_in += 1
+        self.bytes_in += len(frame)
+
+    async def start(self, host: str, port: Optional[int] = None):
+        """Start sampling the loop lag, the summary line and, given a port, the endpoint."""
+        self.tasks.append(asyncio.create_task(self.sample_lag()))
+        if self.interval:
+            self.tasks.append(asyncio.create_task(self.summarize()))
+        if port is not None:
+            self.server = await asyncio.start_server(self.scrape, host, port)
+            log.info(f"Telemetry at http://{host}:{port}/metrics")
+
+    async def sample_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.tick
+            await asyncio.sleep(self.tick)
+            lag = max(0.0, loop.time() - scheduled)
+            self.lag = lag
+            self.lag_max = max(self.lag_max, lag)
+            self.lag_sum += lag
+            for n, bound in enumerate(LAG_BUCKETS):
+                if lag <= bound:
+                    self.lag_buckets[n] += 1
+                    break
+            else:
+                self.lag_buckets[-1] += 1
+
+    async def summarize(self):
+        last = (time.monotonic(), self.frames_in, self.bytes_in, self.frames_out, self.bytes_out)
+        while True:
+            await asyncio.sleep(self.interval)
+            now = (time.monotonic(), self.frames_in, self.bytes_in, self.frames_out, self.bytes_out)
+            seconds = now[0] - last[0]
+            frames_in, bytes_in, frames_out, bytes_out = ((b - a) / seconds for a, b in zip(last[1:], now[1:]))
+            last = now
+            depths = list(self.queues())
+            deepest = max(depths, key=lambda client: client[1], default=(None, 0))
+            log.info(f"telemetry: loop lag {self.lag * 1000:.1f} ms (max {self.lag_max * 1000:.1f} ms), "
+                     f"{len(asyncio.all_tasks())} tasks, {len(depths)} clients, "
+                     f"{sum(depth for _, depth in depths)} frames queued"
+                     f"{f' (most {deepest[1]}, client {deepest[0]})' if deepest[1] else ''}, "
+                     f"in {frames_in:.0f} frames/s {bytes_in / 1024:.1f} KiB/s, "
+                     f"out {frames_out:.0f} frames/s {bytes_out / 1024:.1f} KiB/s")
+            self.lag_max = 0.0
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text format."""
+        lines = []
+
+        def metric(name: str, kind: str, description: str, samples):
+            lines.append(f"# HELP msglist_{name} {description}")
+            lines.append(f"# TYPE msglist_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"msglist_{name}{labels} {value}")
+
+        metric("loop_lag_seconds", "gauge", "Lateness of the last periodic event loop wakeup.", [("", self.lag)])
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(LAG_BUCKETS + ("+Inf",), self.lag_buckets):
+            cumulative += count
+            buckets.append((f'{{le="{bound}"}}', cumulative))
+        lines.append("# HELP msglist_loop_lag_histogram_seconds Lateness of periodic event loop wakeups.")
+        lines.append("# TYPE msglist_loop_lag_histogram_seconds histogram")
+        lines.extend(f"msglist_loop_lag_histogram_seconds_bucket{labels} {value}" for labels, value in buckets)
+        lines.append(f"msglist_loop_lag_histogram_seconds_sum {self.lag_sum}")
+        lines.append(f"msglist_loop_lag_histogram_seconds_count {cumulative}")
+        metric("tasks", "gauge", "Live asyncio tasks.", [("", len(asyncio.all_tasks()))])
+        metric("frames_received_total", "counter", "Frames received from clients.", [("", self.frames_in)])
+        metric("bytes_received_total", "counter", "Bytes of frames received from clients.", [("", self.bytes_in)])
+        metric("frames_sent_total", "counter", "Frames sent to clients.", [("", self.frames_out)])
+        metric("bytes_sent_total", "counter", "Bytes of frames sent to clients.", [("", self.bytes_out)])
+        depths = list(self.queues())
+        metric("clients", "gauge", "Connected clients.", [("", len(depths))])
+        metric("queued_frames", "gauge", "Frames waiting in client outbound queues.",
+               [("", sum(depth for _, depth in depths))])
+        metric("client_queue_depth", "gauge", "Frames waiting in the outbound queue of a client.",
+               [(f'{{client="{client}"}}', depth) for client, depth in depths])
+        metric("throttle_total", "counter", "Rate limiting, by what happened.",
+               [(f'{{event="{event}"}}', count) for event, count in sorted(self.counters.items())])
+        return "\n".join(lines) + "\n"
+
+    async def scrape(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one HTTP request: GET /metrics."""
+        try:
+            request = (await reader.readline()).split()
+            while (await reader.readline()).strip():
+                pass  # headers
+            if len(request) >= 2 and request[0] == b"GET" and request[1].split(b"?")[0] == b"/metrics":
+                status, body = "200 OK", self.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found, try /metrics\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
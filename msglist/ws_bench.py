@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Broadcast benchmark for ws_server.py.
+
+Connects --clients receivers, plus --slow clients that never read, then one
+sender types --messages characters. Reports how long it took until every
+receiver had every character, deliveries per second, and the per-character
+latency from send to receipt.
+
+With --rooms R the receivers are spread over rooms /room-0 .. /room-R-1
+and the sender types into /room-0, so only that room's members should
+receive anything; deliveries to other rooms are reported as leaked.
+
+    python ws_server.py --slow-policy coalesce &
+    python ws_bench.py --clients 1000 --slow 10 --messages 500
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import string
+import time
+from typing import List
+from urllib.parse import urlparse
+import websockets
+import frames
+
+def percentile(values: List[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class Receiver:
+    """A client that records when each broadcast character reaches it."""
+
+    def __init__(self, websocket, sent_at: List[float], total: int):
+        self.websocket = websocket
+        self.sent_at = sent_at
+        self.total = total
+        self.received = 0
+        self.frames = 0
+        self.bytes = 0
+        self.latencies: List[float] = []
+        self.done = asyncio.Event()
+
+    async def run(self):
+        try:
+            async for message in self.websocket:
+                now = time.perf_counter()
+                chars = frames.decode(message)[2].decode('utf-8')
+                # Characters arrive in order; frames may carry several of them.
+                for index in range(self.received, self.received + len(chars)):
+                    self.latencies.append(now - self.sent_at[index])
+                self.received += len(chars)
+                self.frames += 1
+                self.bytes += len(message)
+                if self.received >= self.total:
+                    self.done.set()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+async def connect_slow(uri: str):
+    """A client with a tiny receive buffer that never reads, so it backs up fast."""
+    url = urlparse(uri)
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, (url.hostname, url.port or 80))
+    return await websockets.connect(uri, sock=sock, max_queue=1, subprotocols=list(frames.SUBPROTOCOLS))
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure broadcast fan-out of ws_server.py.")
+    parser.add_argument("--uri", default="ws://localhost:8765")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=0, help="clients that never read")
+    parser.add_argument("--rooms", type=int, default=0,
+                        help="spread the clients over this many rooms, 0 for all in the default room")
+    parser.add_argument("--messages", type=int, default=500, help="characters the sender types")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="characters per second the sender types, 0 for as fast as possible")
+    parser.add_argument("--format", choices=["binary", "json"], default="binary",
+                        help="wire format the clients ask for")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    subprotocols = [frames.SUBPROTOCOL_BINARY if args.format == "binary" else frames.SUBPROTOCOL_JSON]
+    encode = frames.encoder(subprotocols[0])
+    sent_at = [0.0] * args.messages
+    connecting = asyncio.Semaphore(50)
+
+    async def connect(factory):
+        async with connecting:
+            return await factory()
+
+    def room_uri(index: int) -> str:
+        return f"{args.uri}/room-{index % args.rooms}" if args.rooms else args.uri
+
+    sockets = await asyncio.gather(*(connect(lambda i=i: websockets.connect(room_uri(i), subprotocols=subprotocols))
+                                     for i in range(args.clients)))
+    slow = await asyncio.gather(*(connect(lambda: connect_slow(room_uri(0))) for _ in range(args.slow)))
+    all_receivers = [Receiver(websocket, sent_at, args.messages) for websocket in sockets]
+    tasks = [asyncio.create_task(receiver.run()) for receiver in all_receivers]
+    # Those in the sender's room; the rest must not hear anything
+    receivers = all_receivers[::args.rooms] if args.rooms else all_receivers
+    others = [r for i, r in enumerate(all_receivers) if i % args.rooms] if args.rooms else []
+
+    async with websockets.connect(room_uri(0), subprotocols=subprotocols) as sender:
+        await asyncio.sleep(0.5)  # let the server register everyone
+        started = time.perf_counter()
+        for index in range(args.messages):
+            sent_at[index] = time.perf_counter()
+            letter = string.ascii_letters[index % len(string.ascii_letters)]
+            await sender.send(encode(0, index + 1, letter.encode()))
+            if args.rate:
+                await asyncio.sleep(max(0.0, started + (index + 1) / args.rate - time.perf_counter()))
+        sent = time.perf_counter() - started
+        try:
+            await asyncio.wait_for(asyncio.gather(*(r.done.wait() for r in receivers)), args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for receiver in receivers for latency in receiver.latencies)
+    delivered = sum(receiver.received for receiver in receivers)
+    slow_closed = sum(websocket.close_code is not None for websocket in slow)
+    result = {
+        "format": args.format,
+        "clients": args.clients,
+        "rooms": args.rooms,
+        "room_size": len(receivers),
+        "slow_clients": args.slow,
+        "slow_clients_disconnected": slow_closed,
+        "messages": args.messages,
+        "send_seconds": round(sent, 3),
+        "seconds": round(elapsed, 3),
+        "complete_receivers": sum(r.received >= args.messages for r in receivers),
+        "deliveries": delivered,
+        "bytes_received": sum(receiver.bytes for receiver in receivers),
+        "frames_received": sum(receiver.frames for receiver in receivers),
+        "deliveries_per_second": round(delivered / elapsed),
+        "leaked_deliveries": sum(other.received for other in others),
+        "latency_p50_ms": latencies and round(percentile(latencies, 0.5) * 1000, 2),
+        "latency_p99_ms": latencies and round(percentile(latencies, 0.99) * 1000, 2),
+        "latency_max_ms": latencies and round(latencies[-1] * 1000, 2),
+    }
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for key, value in result.items():
+            print(f"{key:>28}: {value}")
+
+    for task in tasks:
+        task.cancel()
+    for websocket in sockets + slow:
+        websocket.transport.abort()
+
+if __name__ == "__main__":
+    asyncio.run(main())
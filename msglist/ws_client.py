@@ -5,11 +5,13 @@ gi.require_version('Soup', '3.0')
 gi.require_version('GLib', '2.0')
 gi.require_version('Gio', '2.0')
 from gi.repository import Soup, GLib, GObject, Gio
-import json
+import codecs
+import os
 import sys
 import termios
 import tty
 import select
+import frames
 
 class WebSocketClient:
     """WebSocket client using libsoup."""
@@ -18,7 +20,11 @@ class WebSocketClient:
         self.uri = uri
         self.session = Soup.Session()
         self.websocket = None
+        self.encode = frames.encode_json
+        self.seq = 0
         self.main_loop = GLib.MainLoop()
+        # A read may end in the middle of a multi-byte character
+        self.stdin_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
         
     def connect(self):
         """Connect to the WebSocket server."""
@@ -26,10 +32,11 @@ class WebSocketClient:
         
         # Create WebSocket connection
         message = Soup.Message.new("GET", self.uri)
+        # Offer the binary format first; servers that do not know it pick JSON
         self.session.websocket_connect_async(
             message, 
             None, 
-            [], 
+            list(frames.SUBPROTOCOLS), 
             0, 
             Gio.Cancellable(),
             self.on_websocket_connected,
@@ -40,6 +47,7 @@ class WebSocketClient:
         """Handle WebSocket connection result."""
         try:
             self.websocket = session.websocket_connect_finish(result)
+            self.encode = frames.encoder(self.websocket.get_protocol())
             print("Connected! Start typing...")
             
             # Connect to message signal
@@ -52,27 +60,32 @@ class WebSocketClient:
     
     def on_message_received(self, websocket, type, message):
         """Handle incoming WebSocket message."""
-        if type == Soup.WebsocketDataType.TEXT:
-            try:
-                data = json.loads(message.get_data().decode('utf-8'))
-                char = data.get('char', '')
-                
-                # Print received character to terminal
-                print(char, end='', flush=True)
-                
-            except json.JSONDecodeError:
-                pass
+        data = message.get_data()
+        try:
+            if type == Soup.WebsocketDataType.TEXT:
+                _, _, payload = frames.decode_json(data.decode('utf-8'))
+            else:
+                _, _, payload = frames.decode_binary(data)
+        except (frames.FrameError, UnicodeDecodeError):
+            return
+
+        # The server merges what a peer types in quick succession into one frame
+        print(payload.decode('utf-8', errors='replace'), end='', flush=True)
     
     def on_websocket_closed(self, websocket):
         """Handle WebSocket connection closed."""
         print("\nWebSocket connection closed.")
         self.main_loop.quit()
     
-    def send_character(self, char):
-        """Send a character to the server."""
+    def send_text(self, text):
+        """Send typed text to the server in the negotiated format."""
         if self.websocket:
-            message = json.dumps({'char': char})
-            self.websocket.send_text(message)
+            self.seq += 1
+            frame = self.encode(0, self.seq, text.encode('utf-8'))
+            if isinstance(frame, bytes):
+                self.websocket.send_binary(frame)
+            else:
+                self.websocket.send_text(frame)
     
     def run(self):
         """Run the client."""
@@ -105,18 +118,23 @@ class WebSocketClient:
     def on_stdin_data(self, source, condition):
         """Handle data available on stdin."""
         if condition & GLib.IO_IN:
-            char = sys.stdin.read(1)
+            # Everything available at once: a paste is one frame, not one per character
+            text = self.stdin_decoder.decode(os.read(sys.stdin.fileno(), 4096))
             
             # Handle Ctrl+C
-            if ord(char) == 3:  # Ctrl+C
+            if '\x03' in text:  # Ctrl+C
+                text = text[:text.index('\x03')]
+                if text:
+                    self.send_text(text)
                 self.main_loop.quit()
                 return False
             
-            # Send character to server
-            self.send_character(char)
+            # Send text to server
+            if text:
+                self.send_text(text)
             
             # Echo locally
-            print(char, end='', flush=True)
+            print(text, end='', flush=True)
         
         return True  # Keep watching
 
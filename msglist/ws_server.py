@@ -1,65 +1,612 @@
 #!/usr/bin/env python3
 
+import argparse
 import asyncio
+import collections
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
 import websockets
-import json
-from typing import Set
+from websockets.protocol import State
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import parse_qs, urlsplit, unquote
+import bus
+import frames
+import history
+import telemetry
+
+# What to do with a client whose outbound queue is full
+SLOW_POLICIES = ("drop-oldest", "disconnect", "coalesce")
+# What to do with a frame that arrives faster than the rate limits allow
+THROTTLE_POLICIES = ("drop", "delay", "disconnect")
+
+Frame = Union[str, bytes]
+
+log = logging.getLogger("msglist")
+
+peer_ids = itertools.count(1)
+# Largest payload the coalesce policy merges frames into. Even as JSON, with
+# the text sent twice and escaped at up to 6 bytes a byte, that stays under
+# the 1 MiB max_size of clients.
+MAX_COALESCED = 64 * 1024
+# Frames a writer sends before letting other tasks run: send() only waits
+# once the socket buffer fills, so a writer draining a deep queue to a fast
+# client would otherwise hold the event loop until it is done.
+WRITE_BATCH = 16
+# Set up by serve() with --telemetry-interval or --telemetry-port
+stats: Optional[telemetry.Telemetry] = None
+
+class Peer:
+    """A connected client and the frames waiting to be sent to it.
+
+    Broadcasting only appends to the peer's queue; its own writer task does
+    the sending, so a client that reads slowly delays nobody but itself.
+    When `limit` frames are already waiting, `policy` decides what gives:
+    drop the oldest frame, disconnect the client, or merge consecutive
+    frames from one sender.
+    """
+
+    def __init__(self, websocket: websockets.ServerConnection, limit: int, policy: str):
+        self.websocket = websocket
+        self.id = next(peer_ids)
+        self.encode = frames.encoder(websocket.subprotocol)
+        self.limit = limit
+        self.policy = policy
+        self.typed: List[bytes] = []  # UTF-8 text from this client not broadcast yet
+        self.typed_length = 0
+        self.flush_timer: Optional[asyncio.TimerHandle] = None
+        self.pending: Deque[Tuple[int, int, bytes, Frame]] = collections.deque()  # (sender, seq, payload, frame)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.coalesced = 0
+        self.evicted = False
+        self.closer: Optional[asyncio.Task] = None
+        self.bucket: Optional[TokenBucket] = None  # inbound rate limit, if any
+        self.throttled = 0  # inbound frames dropped or delayed
+        self.writer = asyncio.create_task(self.write())
+
+    def enqueue(self, sender: int, seq: int, payload: bytes, frame: Frame):
+        """Queue a frame for this client; never blocks."""
+        if self.evicted:
+            return
+        pending = self.pending
+        if len(pending) >= self.limit:
+            if self.policy == "disconnect":
+                self.evict()
+                return
+            if self.policy == "coalesce":
+                self.coalesce()
+            if len(pending) >= self.limit:
+                pending.popleft()
+                self.dropped += 1
+        pending.append((sender, seq, payload, frame))
+        self.ready.set()
+
+    def coalesce(self):
+        """Merge each run of waiting frames from one sender, keeping every character.
+
+        Frames stay in arrival order, so seqs never go backwards. A run stops
+        growing at MAX_COALESCED bytes; if the queue is still full afterwards,
+        as when many senders take turns, enqueue() drops the oldest.
+        """
+        merged: List[Tuple[int, int, bytes, Frame]] = []
+        run: List[Tuple[int, int, bytes, Frame]] = []
+        run_length = 0
+        for entry in self.pending:
+            if run and (entry[0] != run[0][0] or run_length + len(entry[2]) > MAX_COALESCED):
+                merged.append(self._merge(run))
+                run = []
+                run_length = 0
+            run.append(entry)
+            run_length += len(entry[2])
+        if run:
+            merged.append(self._merge(run))
+        self.coalesced += len(self.pending) - len(merged)
+        self.pending.clear()
+        self.pending.extend(merged)
+
+    def _merge(self, run: List[Tuple[int, int, bytes, Frame]]) -> Tuple[int, int, bytes, Frame]:
+        """One queue entry for a run of frames from one sender, with the seq of the last."""
+        if len(run) == 1:
+            return run[0]
+        sender, seq = run[-1][0], run[-1][1]
+        payload = b"".join(entry[2] for entry in run)
+        return sender, seq, payload, self.encode(sender, seq, payload)
+
+    def evict(self):
+        """Disconnect a client that cannot keep up."""
+        self.evicted = True
+        self.pending.clear()
+        self.writer.cancel()
+        self.closer = asyncio.create_task(self.websocket.close(1008, "slow consumer"))
+
+    async def write(self):
+        """Send queued frames in order until the connection closes."""
+        pending = self.pending
+        try:
+            while True:
+                await self.ready.wait()
+                sent = 0
+                while pending:
+                    frame = pending.popleft()[3]
+                    await self.websocket.send(frame)
+                    if stats is not None:
+                        stats.frames_out += 1
+                        stats.bytes_out += len(frame)
+                    sent += 1
+                    if sent % WRITE_BATCH == 0:
+                        await asyncio.sleep(0)
+                self.ready.clear()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+# Longest room name a client may use
+MAX_ROOM_NAME = 256
+
+class RoomIndex:
+    """Which clients are in which room, indexed both ways.
+
+    `members` maps a room to its clients, which is what a broadcast walks;
+    `rooms_of` maps a client to its rooms, so a disconnect only touches the
+    rooms the client was in. Joining and leaving are a set insert/delete
+    in each; empty rooms are dropped. The bus hears when a room gets its
+    first member here and when it loses its last one.
+    """
+
+    def __init__(self, room_bus):
+        self.bus = room_bus
+        self.members: Dict[str, Set[Peer]] = {}
+        self.rooms_of: Dict[Peer, Set[str]] = {}
+
+    def join(self, peer: Peer, room: str):
+        members = self.members.get(room)
+        if members is None:
+            members = self.members[room] = set()
+            self.bus.subscribe(room)
+        members.add(peer)
+        self.rooms_of.setdefault(peer, set()).add(room)
+
+    def _remove_member(self, peer: Peer, room: str):
+        members = self.members[room]
+        members.discard(peer)
+        if not members:
+            del self.members[room]
+            self.bus.unsubscribe(room)
+
+    def leave(self, peer: Peer, room: str):
+        rooms = self.rooms_of.get(peer)
+        if rooms is None or room not in rooms:
+            return
+        rooms.discard(room)
+        if not rooms:
+            del self.rooms_of[peer]
+        self._remove_member(peer, room)
+
+    def leave_all(self, peer: Peer):
+        for room in self.rooms_of.pop(peer, ()):
+            self._remove_member(peer, room)
+
+    def audience(self, rooms: List[str]) -> Iterable[Peer]:
+        """Local members of any of `rooms`, once each."""
+        if len(rooms) == 1:
+            return self.members.get(rooms[0], ())
+        return set().union(*(self.members.get(room, ()) for room in rooms))
+
+def room_from_path(path: str) -> str:
+    """Room named by a request path: /lobby is "lobby", / is the default room ""."""
+    return unquote(urlsplit(path).path).strip("/")
+
+def since_from_path(path: str) -> Optional[int]:
+    """Sequence number a reconnecting client has seen up to, from /room?since=N."""
+    values = parse_qs(urlsplit(path).query).get("since")
+    try:
+        return int(values[0]) if values else None
+    except ValueError:
+        return None
 
 # Store connected clients
-connected_clients: Set[websockets.WebSocketServerProtocol] = set()
+connected_clients: Set[Peer] = set()
+# Set up by serve(): a LocalBus, or a BusClient in a --workers process
+room_bus = None
+room_index: Optional[RoomIndex] = None
+# Recent messages, how many of them a joining client gets, and the message log (--log) if any
+recent: Optional[history.HistoryRing] = None
+history_size = 0
+message_log: Optional[history.LogReader] = None
+# Most log messages one catch-up walks
+max_catch_up = 10000
+
+def broadcast(sender: Peer, payload: bytes):
+    """Publish `payload` to the rooms of the sender."""
+    rooms = room_index.rooms_of.get(sender)
+    if rooms:
+        room_bus.publish(rooms, sender.id, payload)
+
+def deliver(rooms: List[str], sender: int, seq: int, payload: bytes):
+    """Queue a published message for the local members of `rooms`, sender excluded.
+
+    The frame is built at most once per wire format, and the payload bytes
+    go out exactly as they came in.
+    """
+    if recent is not None:
+        recent.append(seq, sender, rooms, payload)
+    encoded: Dict[object, Frame] = {}
+    for peer in room_index.audience(rooms):
+        if peer.id != sender:
+            frame = encoded.get(peer.encode)
+            if frame is None:
+                frame = encoded[peer.encode] = peer.encode(sender, seq, payload)
+            peer.enqueue(sender, seq, payload, frame)
+
+# Largest frame a replay merges messages into
+MAX_REPLAY_FRAME = 64 * 1024
+
+def replay(peer: Peer, room: str, since: Optional[int] = None):
+    """Queue the history of `room` for a client that just joined it.
+
+    A client reconnecting with ?since=N gets every message after seq N from
+    the log, if there is one; otherwise it gets what is still in the ring,
+    as does any other client. Workers with a log replay its tail instead of
+    keeping a ring. Consecutive messages from one sender are merged into
+    one frame, with the seq of the last.
 
-async def handle_client(websocket: websockets.WebSocketServerProtocol):
+    The walk runs on the event loop without yielding, so a catch-up from
+    the log covers at most the last `max_catch_up` messages; a client
+    further behind sees a gap before the first seq it gets.
+    """
+    if since is None and recent is not None:
+        messages = recent.since(0)
+    elif message_log is not None:
+        last = message_log.last_seq()
+        if since is None:
+            since = last - history_size
+        elif since < last - max_catch_up:
+            log.info(f"Client {peer.id} is {last - since} messages behind, catching up on the last {max_catch_up}")
+        messages = message_log.since(max(since, last - max_catch_up))
+    elif recent is not None:
+        messages = recent.since(since)
+    else:
+        return
+    run: List[bytes] = []
+    run_sender = run_seq = run_length = 0
+    for seq, sender, rooms, payload in messages:
+        if room not in rooms:
+            continue
+        if run and (sender != run_sender or run_length + len(payload) > MAX_REPLAY_FRAME):
+            merged = b"".join(run)
+            peer.enqueue(run_sender, run_seq, merged, peer.encode(run_sender, run_seq, merged))
+            run.clear()
+            run_length = 0
+        run.append(payload)
+        run_sender, run_seq = sender, seq
+        run_length += len(payload)
+    if run:
+        merged = b"".join(run)
+        peer.enqueue(run_sender, run_seq, merged, peer.encode(run_sender, run_seq, merged))
+
+class Coalescer:
+    """Merges what a client types within `window` seconds into one broadcast.
+
+    The first text after a quiet spell starts the window; everything
+    arriving before it ends, up to `max_length` bytes, goes out as a
+    single frame. A paste of hundreds of characters thus becomes a few
+    frames per recipient instead of hundreds. A window of 0 broadcasts
+    every frame as it arrives.
+    """
+
+    def __init__(self, window: float, max_length: int):
+        self.window = window
+        self.max_length = max_length
+
+    def add(self, sender: Peer, payload: bytes):
+        if not self.window:
+            broadcast(sender, payload)
+            return
+        sender.typed.append(payload)
+        sender.typed_length += len(payload)
+        if sender.typed_length >= self.max_length:
+            self.flush(sender)
+        elif sender.flush_timer is None:
+            sender.flush_timer = asyncio.get_running_loop().call_later(self.window, self.flush, sender)
+
+    def flush(self, sender: Peer):
+        if sender.flush_timer is not None:
+            sender.flush_timer.cancel()
+            sender.flush_timer = None
+        if sender.typed:
+            payload = b"".join(sender.typed)
+            sender.typed.clear()
+            sender.typed_length = 0
+            broadcast(sender, payload)
+
+class TokenBucket:
+    """`rate` tokens a second, of which up to `burst` may be saved up."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available, 0 if one is now."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class Throttle:
+    """Admission control for inbound frames.
+
+    Every frame takes a token from its client's bucket and from one shared
+    by the whole process; either limit is off at a rate of 0. A frame that
+    finds a bucket empty is dropped, waits for the tokens (which stops
+    reading from that client, so TCP pushes back on it), or gets its client
+    disconnected, as `policy` says. Only a client's own bucket running dry
+    disconnects it; an empty global bucket drops the frame instead under
+    that policy.
+    """
+
+    def __init__(self, rate: float, burst: float, global_rate: float, global_burst: float, policy: str):
+        self.rate = rate
+        self.burst = burst
+        self.shared = TokenBucket(global_rate, global_burst) if global_rate else None
+        self.policy = policy
+        self.counters: Dict[str, int] = collections.Counter()
+
+    def bucket(self) -> Optional[TokenBucket]:
+        """A new client's bucket."""
+        return TokenBucket(self.rate, self.burst) if self.rate else None
+
+    def admit(self, peer: Peer) -> float:
+        """Take a token for a frame from `peer`: 0, or how long until there is one."""
+        own, shared = peer.bucket, self.shared
+        if own is None and shared is None:
+            return 0.0
+        now = time.monotonic()
+        wait = max(own.wait(now) if own else 0.0, shared.wait(now) if shared else 0.0)
+        if not wait:
+            if own:
+                own.tokens -= 1
+            if shared:
+                shared.tokens -= 1
+        return wait
+
+    async def hold(self, peer: Peer, wait: float) -> bool:
+        """Apply the policy to a frame that arrived too fast; True if it may go on after all."""
+        if not peer.throttled:
+            self.counters["clients_throttled"] += 1
+        peer.throttled += 1
+        if self.policy == "delay":
+            self.counters["frames_delayed"] += 1
+            while wait:
+                # Once closing, e.g. at shutdown, the rest of a backlog is dropped, not waited for
+                if peer.websocket.state is not State.OPEN:
+                    self.counters["frames_dropped"] += 1
+                    return False
+                await asyncio.sleep(wait)
+                wait = self.admit(peer)
+            return True
+        if self.policy == "disconnect" and peer.bucket is not None and peer.bucket.tokens < 1:
+            # Frames already received while it closes end up here too
+            if not peer.evicted:
+                self.counters["clients_disconnected"] += 1
+                peer.evicted = True
+                await peer.websocket.close(1008, "rate limit exceeded")
+            return False
+        self.counters["frames_dropped"] += 1
+        return False
+
+async def handle_client(websocket: websockets.ServerConnection, limit: int, policy: str,
+                        coalescer: Coalescer, throttle: Throttle):
     """Handle a new client connection."""
-    global connected_clients
-    print(f"Client connected from {websocket.remote_address}")
-    connected_clients.add(websocket)
-    
+    room = room_from_path(websocket.request.path)
+    if len(room) > MAX_ROOM_NAME:
+        log.warning(f"Room name from {websocket.remote_address} too long")
+        await websocket.close(1008, "room name too long")
+        return
+    peer = Peer(websocket, limit, policy)
+    peer.bucket = throttle.bucket()
+    log.info(f"Client {peer.id} connected from {websocket.remote_address}"
+             f" speaking {websocket.subprotocol or 'JSON'}, room {room!r}")
+    connected_clients.add(peer)
+    room_index.join(peer, room)
+    replay(peer, room, since_from_path(websocket.request.path))
+
     try:
         async for message in websocket:
+            if stats is not None:
+                stats.received(message)
+            wait = throttle.admit(peer)
+            if wait and not await throttle.hold(peer, wait):
+                continue
             try:
                 # Parse the message
-                data = json.loads(message)
-                char = data.get('char', '')
-                
-                print(f"Received '{char}' from {websocket.remote_address}")
-                
-                # Broadcast to all other clients (except sender)
-                if connected_clients:
-                    # Create response message
-                    response = json.dumps({'char': char})
-                    
-                    # Send to all clients except the sender
-                    disconnected = set()
-                    for client in connected_clients:
-                        if client != websocket:
-                            try:
-                                await client.send(response)
-                            except websockets.exceptions.ConnectionClosed:
-                                disconnected.add(client)
-                    
-                    # Remove disconnected clients
-                    connected_clients -= disconnected
-                    
-            except json.JSONDecodeError:
-                print(f"Invalid JSON from {websocket.remote_address}: {message}")
+                decoded = frames.decode(message)
+                if isinstance(decoded, frames.Control):
+                    # Text typed so far belongs to the rooms it was typed in
+                    coalescer.flush(peer)
+                    if len(decoded.room) > MAX_ROOM_NAME:
+                        log.warning(f"Room name from client {peer.id} too long")
+                    elif decoded.action == frames.Control.JOIN:
+                        rooms = room_index.rooms_of.get(peer, ())
+                        if decoded.room not in rooms:
+                            if len(rooms) >= bus.MAX_ROOMS:
+                                log.warning(f"Client {peer.id} is already in {bus.MAX_ROOMS} rooms")
+                            else:
+                                room_index.join(peer, decoded.room)
+                                replay(peer, decoded.room)
+                    else:
+                        room_index.leave(peer, decoded.room)
+                    continue
+                _, _, payload = decoded
+
+                # Per frame, so formatted only when asked for
+                log.debug("Received %r from client %d", payload, peer.id)
+                coalescer.add(peer, payload)
+
+            except frames.FrameError as e:
+                log.warning("Invalid frame from client %d: %s", peer.id, e)
             except Exception as e:
-                print(f"Error handling message from {websocket.remote_address}: {e}")
-                
+                log.error("Error handling message from %s: %s", websocket.remote_address, e)
+
     except websockets.exceptions.ConnectionClosed:
-        print(f"Client {websocket.remote_address} disconnected")
+        log.info(f"Client {websocket.remote_address} disconnected")
     finally:
-        connected_clients.discard(websocket)
+        coalescer.flush(peer)  # what it typed last still reaches everyone
+        room_index.leave_all(peer)
+        connected_clients.discard(peer)
+        peer.writer.cancel()
+        if peer.evicted:
+            log.info(f"Disconnected {'flooding' if peer.throttled else 'slow'} client {websocket.remote_address}")
+        elif peer.dropped or peer.coalesced:
+            log.info(f"Client {websocket.remote_address} was slow: "
+                     f"{peer.dropped} frames dropped, {peer.coalesced} coalesced")
+        if peer.throttled:
+            log.info(f"Client {peer.id} went over the rate limit with {peer.throttled} frames"
+                     f" ({throttle.policy}); server totals {dict(throttle.counters)}")
+
+async def serve(args, worker: int = 0, bus_path: Optional[str] = None):
+    """Run one server process; with `bus_path` it is worker `worker` of args.workers."""
+    global peer_ids, room_bus, room_index, recent, history_size, message_log, max_catch_up, stats
+    history_size = args.history
+    max_catch_up = args.max_catch_up
+    # A worker only sees the rooms it has members in; the log has them all
+    if args.history and not (bus_path and args.log):
+        recent = history.HistoryRing(args.history)
+    if bus_path is None:
+        if args.log:
+            message_log = history.MessageLog(args.log)
+        room_bus = bus.LocalBus(deliver, message_log)
+        stopped = asyncio.get_running_loop().create_future()  # Run forever
+    else:
+        # Ids stay unique across workers: worker w hands out w+1, w+1+N, ...
+        peer_ids = itertools.count(worker + 1, args.workers)
+        # The broker writes the log; workers only read it
+        if args.log:
+            message_log = history.LogReader(args.log)
+        room_bus = await bus.BusClient.connect(bus_path, deliver)
+        stopped = room_bus.lost
+    room_index = RoomIndex(room_bus)
+    coalescer = Coalescer(args.coalesce_ms / 1000, args.coalesce_max)
+    throttle = Throttle(args.rate, args.burst, args.global_rate, args.global_burst, args.throttle_policy)
+    if args.telemetry_interval or args.telemetry_port is not None:
+        stats = telemetry.Telemetry(lambda: ((peer.id, len(peer.pending)) for peer in connected_clients),
+                                    throttle.counters, args.telemetry_interval)
+        await stats.start(args.host, None if args.telemetry_port is None else args.telemetry_port + worker)
+
+    async def handler(websocket):
+        await handle_client(websocket, args.queue_size, args.slow_policy, coalescer, throttle)
+
+    async with websockets.serve(handler, args.host, args.port, reuse_port=bus_path is not None,
+                                subprotocols=list(frames.SUBPROTOCOLS),
+                                select_subprotocol=frames.select_subprotocol):
+        await stopped
+    if bus_path is not None:
+        log.warning(f"Worker {worker} lost the bus broker, exiting")
+
+def configure_logging(level: str):
+    """Log the server's own messages to stdout; other loggers keep their defaults."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(level.upper())
 
-async def main():
+def run_worker(args, worker: int, bus_path: str):
+    """Body of a --workers process."""
+    configure_logging(args.log_level)
+    try:
+        asyncio.run(serve(args, worker, bus_path))
+    except KeyboardInterrupt:
+        pass
+
+async def run_sharded(args):
+    """Run the bus broker and args.workers server processes sharing the port."""
+    bus_path = args.bus or os.path.join(tempfile.gettempdir(), f"msglist-bus-{os.getpid()}.sock")
+    if os.path.exists(bus_path):
+        os.unlink(bus_path)
+    broker = bus.Broker(history.MessageLog(args.log) if args.log else None)
+    server = await broker.serve(bus_path)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(args, worker, bus_path), name=f"msglist-worker-{worker}")
+               for worker in range(args.workers)]
+    # Stop the workers and remove the socket on SIGTERM too
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        for process in workers:
+            process.start()
+        log.info(f"Started {args.workers} workers sharing port {args.port}, bus at {bus_path}")
+        await asyncio.gather(*(asyncio.to_thread(process.join) for process in workers))
+    except asyncio.CancelledError:
+        log.info("\nServer shutting down...")
+    finally:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        server.close()
+        os.unlink(bus_path)
+
+def main():
     """Start the websocket server."""
-    print("Starting WebSocket server on ws://localhost:8765")
-    print("Waiting for clients to connect...")
-    
-    async with websockets.serve(handle_client, "localhost", 8765):
-        await asyncio.Future()  # Run forever
+    parser = argparse.ArgumentParser(
+        description="Broadcast typed characters to the other clients in the same rooms. "
+                    "Clients pick a room with the URL path (ws://host:port/room) and may "
+                    "join and leave more.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="server processes accepting on the port with SO_REUSEPORT, "
+                             "linked by a local pub/sub bus")
+    parser.add_argument("--bus", metavar="PATH",
+                        help="Unix socket of the bus with --workers (default: in the temp directory)")
+    parser.add_argument("--history", type=int, default=1000,
+                        help="recent messages kept in memory and replayed to clients joining a room, 0 for none")
+    parser.add_argument("--log", metavar="PATH",
+                        help="append every message to this log (and PATH.idx), so a client reconnecting "
+                             "to /room?since=N catches up on everything after seq N")
+    parser.add_argument("--max-catch-up", type=int, default=10000,
+                        help="most messages of the log a reconnecting client catches up on")
+    parser.add_argument("--queue-size", type=int, default=1024,
+                        help="frames that may wait for one client before the slow-client policy applies")
+    parser.add_argument("--slow-policy", choices=SLOW_POLICIES, default="coalesce",
+                        help="what to do when a client's queue is full")
+    parser.add_argument("--coalesce-ms", type=float, default=10,
+                        help="merge what a client types within this many milliseconds into one frame, 0 to disable")
+    parser.add_argument("--coalesce-max", type=int, default=256,
+                        help="bytes after which a merged frame is sent without waiting")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="frames a second each client may send, 0 (the default) for no limit")
+    parser.add_argument("--burst", type=float, default=40,
+                        help="frames a client may send at once after being quiet")
+    parser.add_argument("--global-rate", type=float, default=0,
+                        help="frames a second all clients together may send (per worker process), 0 for no limit")
+    parser.add_argument("--global-burst", type=float, default=1000,
+                        help="frames all clients together may send at once")
+    parser.add_argument("--throttle-policy", choices=THROTTLE_POLICIES, default="delay",
+                        help="what to do with a frame that exceeds a rate limit")
+    parser.add_argument("--log-level", choices=("debug", "info", "warning"), default="info",
+                        help="debug also logs every frame received")
+    parser.add_argument("--telemetry-interval", type=float, default=0, metavar="SECONDS",
+                        help="log a line of loop lag, tasks, queue depths and traffic this often, 0 for never")
+    parser.add_argument("--telemetry-port", type=int,
+                        help="serve the same as Prometheus metrics at http://host:PORT/metrics "
+                             "(worker w of --workers on PORT + w)")
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+
+    log.info(f"Starting WebSocket server on ws://{args.host}:{args.port}")
+    log.info("Waiting for clients to connect...")
+    if args.workers > 1:
+        asyncio.run(run_sharded(args))
+    else:
+        asyncio.run(serve(args))
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except KeyboardInterrupt:
-        print("\nServer shutting down...")
\ No newline at end of file
+        log.info("\nServer shutting down...")
@@ -1,20 +1,46 @@
+import importlib.util
 import subprocess
+import sys
+
+
+def _skip_grpc_stubs():
+    print('grpcio-tools is not installed, skipping the gRPC stubs '
+          '(install the grpc extra for wscat-grpc)', file=sys.stderr)
 
 
 def task_build_protos():
     """Build protocol buffer files"""
-    return {
-        'actions': [
-            [
-                'protoc',
-                '-I=../proto',
-                '--python_out=src/wscat/server',
-                '--pyi_out=src/wscat/server', 
-                '../proto/simple_math.proto'
-            ]
+    actions = [
+        [
+            'protoc',
+            '-I=../proto',
+            '--python_out=src/wscat/server',
+            '--pyi_out=src/wscat/server', 
+            '../proto/simple_math.proto'
         ],
+    ]
+    targets = [
+        'src/wscat/server/simple_math_pb2.py',
+        'src/wscat/server/simple_math_pb2.pyi',
+    ]
+    # gRPC stubs for the SimpleMath service, generated when grpcio-tools
+    # (part of the `grpc` extra) is installed; wscat-grpc says so when they
+    # are missing. Mapping ../proto to wscat/server makes the stub import
+    # wscat.server.simple_math_pb2.
+    if importlib.util.find_spec('grpc_tools') is not None:
+        actions.append([
+            sys.executable, '-m', 'grpc_tools.protoc',
+            '-Iwscat/server=../proto',
+            '--grpc_python_out=src',
+            '../proto/simple_math.proto'
+        ])
+        targets.append('src/wscat/server/simple_math_pb2_grpc.py')
+    else:
+        actions.append(_skip_grpc_stubs)
+    return {
+        'actions': actions,
         'file_dep': ['../proto/simple_math.proto'],
-        'targets': ['src/wscat/server/simple_math_pb2.py', 'src/wscat/server/simple_math_pb2.pyi'],
+        'targets': targets,
         'clean': True,
     }
 
@@ -35,3 +61,13 @@ def task_run_server():
         'uptodate': [False],
         'verbosity': 2,
     }
+
+
+def task_serve():
+    """Run the server with one worker per core, without auto-reload"""
+    return {
+        'actions': [['wscat-serve']],
+        'task_dep': ['build_protos'],
+        'uptodate': [False],
+        'verbosity': 2,
+    }
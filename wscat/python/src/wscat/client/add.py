@@ -1,20 +1,89 @@
-import requests
+import argparse
+import asyncio
+import random
 import sys
-from wscat.server import simple_math_pb2
+import time
+import httpx
+import websockets
+from wscat.codec import CODECS
+from wscat.client.add_client import DEFAULT_URL, AddClient, AddStreamClient, AsyncAddClient
+
+def random_operand():
+    return random.randint(-2**31, 2**31 - 1)
+
+def send_single(client):
+    result = client.add(100, 50)
+    print(f"Success! Result from server: {result}")
+
+def send_batch(client, size):
+    """Send `size` random additions in a single /add/batch request."""
+    a = [random_operand() for _ in range(size)]
+    b = [random_operand() for _ in range(size)]
+    results, overflows = client.add_batch(a, b)
+    for x, y, result, overflow in list(zip(a, b, results, overflows))[:10]:
+        print(f"{x} + {y} = {result}{' (overflow)' if overflow else ''}")
+    print(f"Success! {len(results)} results, {sum(overflows)} overflowed")
+
+async def send_many(args):
+    """Send `args.count` additions, `args.concurrency` requests (or frames) at a time."""
+    pairs = [(random.randint(-1000, 1000), random.randint(-1000, 1000)) for _ in range(args.count)]
+    if args.stream:
+        client = AddStreamClient(
+            args.url, window=args.concurrency, frame_size=args.frame_size, codec=args.codec)
+    else:
+        # HTTP/1.1 needs a connection per request in flight; HTTP/2 multiplexes them.
+        connections = args.connections or (1 if args.http2 else args.concurrency)
+        client = AsyncAddClient(
+            args.url, pool_size=connections, timeout=args.timeout, retries=args.retries,
+            codec=args.codec, http2=args.http2)
+    async with client:
+        started = time.perf_counter()
+        if args.stream:
+            results = await client.add_many(pairs)
+        else:
+            results = await client.add_many(pairs, concurrency=args.concurrency)
+        elapsed = time.perf_counter() - started
+    wrong = sum(result != a + b for (a, b), result in zip(pairs, results))
+    print(f"Success! {len(results)} results in {elapsed:.3f}s "
+          f"({len(results) / elapsed:.0f} req/s), {wrong} wrong")
 
 def main():
-    add_req = simple_math_pb2.AddRequest(a=100, b=50)
-    payload = add_req.SerializeToString()
-    headers = {'Content-Type': 'application/protobuf'}
+    parser = argparse.ArgumentParser(description="Send additions to the wscat server.")
+    parser.add_argument("--url", default=DEFAULT_URL, help="server base URL, or unix:SOCKET")
+    parser.add_argument("--batch", type=int, metavar="N",
+                        help="send N random additions in one /add/batch request")
+    parser.add_argument("--count", type=int, default=1,
+                        help="number of /add requests to send")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="maximum requests in flight (frames with --stream)")
+    parser.add_argument("--http2", action="store_true",
+                        help="send the requests as HTTP/2 streams (h2c, needs wscat-serve --http2)")
+    parser.add_argument("--connections", type=int,
+                        help="connection pool size (default: --concurrency, or 1 with --http2)")
+    parser.add_argument("--stream", action="store_true",
+                        help="send the additions over one /add/stream WebSocket")
+    parser.add_argument("--frame-size", type=int, default=1,
+                        help="with --stream: additions packed into each WebSocket frame")
+    parser.add_argument("--codec", choices=sorted(CODECS), default="protobuf",
+                        help="wire format codec for AddRequest/AddResponse")
+    parser.add_argument("--timeout", type=float, default=5.0, help="per-request timeout in seconds")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="retries on connection errors and 5xx responses")
+    args = parser.parse_args()
+    if args.batch and (args.count > 1 or args.stream or args.http2):
+        parser.error("--batch sends one /add/batch request and cannot be combined with --count, --stream or --http2")
 
     try:
-        response = requests.post("http://127.0.0.1:8000/add", data=payload, headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes
-
-        add_resp = simple_math_pb2.AddResponse()
-        add_resp.ParseFromString(response.content)
-        print(f"Success! Result from server: {add_resp.result}")
-    except requests.exceptions.RequestException as e:
+        if args.count > 1 or args.stream or args.http2:
+            asyncio.run(send_many(args))
+            return
+        with AddClient(args.url, timeout=args.timeout, retries=args.retries,
+                       codec=args.codec) as client:
+            if args.batch:
+                send_batch(client, args.batch)
+            else:
+                send_single(client)
+    except (httpx.HTTPError, OSError, websockets.exceptions.WebSocketException) as e:
         print(f"Error connecting to the server: {e}", file=sys.stderr)
         sys.exit(1)
 
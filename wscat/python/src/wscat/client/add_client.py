@@ -0,0 +1,223 @@
+"""Pooled clients for the wscat /add endpoints.
+
+`AddClient` is the blocking API, `AsyncAddClient` the asyncio one. Both keep
+a pool of keep-alive connections, so only the first requests on each
+connection pay for the TCP handshake. `AddStreamClient` sends additions
+over a single /add/stream WebSocket instead of one HTTP request each.
+
+    with AddClient() as client:
+        print(client.add(100, 50))
+        print(client.add_many([(1, 2), (3, 4)], concurrency=16))
+"""
+import asyncio
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from wscat.client.transport import connect_websocket, http_client_options
+from wscat.codec import get_codec
+from wscat.server import simple_math_pb2
+from wscat.server.delimited import encode_delimited, iter_delimited
+
+DEFAULT_URL = "http://127.0.0.1:8000"
+HEADERS = {'Content-Type': 'application/protobuf'}
+
+def _limits(pool_size):
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+
+def _should_retry(response):
+    return response.status_code >= 500
+
+def _encode_batch(a, b):
+    return simple_math_pb2.AddBatchRequest(a=a, b=b).SerializeToString()
+
+def _decode_batch(response):
+    batch_resp = simple_math_pb2.AddBatchResponse()
+    batch_resp.ParseFromString(response.content)
+    return list(batch_resp.result), list(batch_resp.overflow)
+
+class AddClient:
+    """Blocking /add client over a pool of keep-alive connections.
+
+    Transport errors and 5xx responses are retried `retries` times with
+    exponential backoff starting at `backoff` seconds. Safe to share
+    between threads.
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, pool_size=10, timeout=5.0, retries=2, backoff=0.05,
+                 codec="protobuf"):
+        self.codec = get_codec(codec)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.http = httpx.Client(
+            headers=HEADERS, timeout=timeout, **http_client_options(base_url, _limits(pool_size)))
+
+    def _post(self, path, payload):
+        for attempt in itertools.count():
+            try:
+                response = self.http.post(path, content=payload)
+                if not (_should_retry(response) and attempt < self.retries):
+                    response.raise_for_status()
+                    return response
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def add(self, a, b):
+        response = self._post("/add", self.codec.encode_add_request(a, b))
+        return self.codec.decode_add_response(response.content)
+
+    def add_batch(self, a, b):
+        """Add pairwise in one /add/batch request; returns (results, overflow flags)."""
+        return _decode_batch(self._post("/add/batch", _encode_batch(a, b)))
+
+    def add_many(self, pairs, concurrency=None):
+        """Add every (a, b) pair with up to `concurrency` requests in flight.
+
+        Results come back in input order. Defaults to one request per pooled
+        connection.
+        """
+        with ThreadPoolExecutor(max_workers=concurrency or self.pool_size) as executor:
+            return list(executor.map(lambda pair: self.add(*pair), pairs))
+
+    def close(self):
+        self.http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class AsyncAddClient:
+    """asyncio counterpart of `AddClient`.
+
+    With `http2=True` requests are HTTP/2 streams (h2c); `pool_size=1` then
+    multiplexes every request in flight over a single connection.
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, pool_size=100, timeout=5.0, retries=2, backoff=0.05,
+                 codec="protobuf", http2=False):
+        self.codec = get_codec(codec)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.http = httpx.AsyncClient(
+            headers=HEADERS, timeout=timeout,
+            **http_client_options(base_url, _limits(pool_size), asynchronous=True, http2=http2))
+
+    async def _post(self, path, payload):
+        for attempt in itertools.count():
+            try:
+                response = await self.http.post(path, content=payload)
+                if not (_should_retry(response) and attempt < self.retries):
+                    response.raise_for_status()
+                    return response
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def add(self, a, b):
+        response = await self._post("/add", self.codec.encode_add_request(a, b))
+        return self.codec.decode_add_response(response.content)
+
+    async def add_batch(self, a, b):
+        return _decode_batch(await self._post("/add/batch", _encode_batch(a, b)))
+
+    async def add_many(self, pairs, concurrency=None):
+        """Add every (a, b) pair with up to `concurrency` requests in flight.
+
+        A fixed set of worker coroutines pulls from `pairs` instead of
+        creating one task per pair.
+        """
+        pairs = list(pairs)
+        results = [None] * len(pairs)
+        jobs = iter(enumerate(pairs))
+
+        async def worker():
+            for index, (a, b) in jobs:
+                results[index] = await self.add(a, b)
+
+        workers = min(concurrency or self.pool_size, len(pairs))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return results
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+class AddStreamClient:
+    """asyncio client for /add/stream: many additions over one WebSocket.
+
+    At most `window` frames are unanswered at any time. With
+    `frame_size` > 1, that many additions share one length-delimited frame.
+
+        async with AddStreamClient(window=64, frame_size=32) as client:
+            results = await client.add_many(pairs)
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, window=64, frame_size=1, codec="protobuf"):
+        self.codec = get_codec(codec)
+        self.window = window
+        self.frame_size = frame_size
+        self.base_url = base_url
+        self.path = "/add/stream?delimited=1" if frame_size > 1 else "/add/stream"
+        self.websocket = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        self.websocket = await connect_websocket(self.base_url, self.path)
+        return self
+
+    def _encode(self, chunk):
+        encode = self.codec.encode_add_request
+        if self.frame_size > 1:
+            return encode_delimited([encode(a, b) for a, b in chunk])
+        return encode(*chunk[0])
+
+    def _decode(self, frame):
+        payloads = iter_delimited(frame) if self.frame_size > 1 else [frame]
+        return [self.codec.decode_add_response(payload) for payload in payloads]
+
+    async def add_many(self, pairs):
+        """Add every (a, b) pair; results come back in input order."""
+        pairs = list(pairs)
+        chunks = [pairs[i:i + self.frame_size] for i in range(0, len(pairs), self.frame_size)]
+        slots = asyncio.Semaphore(self.window)
+
+        async def sender():
+            for chunk in chunks:
+                await slots.acquire()
+                await self.websocket.send(self._encode(chunk))
+
+        results = []
+        async with self.lock:  # responses are matched to requests by order
+            sending = asyncio.create_task(sender())
+            try:
+                for _ in chunks:
+                    results.extend(self._decode(await self.websocket.recv()))
+                    slots.release()
+            finally:
+                sending.cancel()
+        return results
+
+    async def add(self, a, b):
+        return (await self.add_many([(a, b)]))[0]
+
+    async def aclose(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
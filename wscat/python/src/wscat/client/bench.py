@@ -0,0 +1,259 @@
+"""Load generator for the wscat /add and /math endpoints.
+
+Runs the same workload against one or more servers (for example the Python
+app and the Rust axum server) and prints a side-by-side report:
+
+    uv run wscat-bench --target python=http://127.0.0.1:8000 \\
+                       --target rust=http://127.0.0.1:8001
+
+A grpc://HOST:PORT target runs the same workload against wscat-grpc, with
+unary Add calls for /add and MathGame streams for /math.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+import httpx
+import websockets
+from wscat.client.transport import connect_websocket, http_client_options
+from wscat.server import simple_math_pb2
+
+HEADERS = {'Content-Type': 'application/protobuf'}
+GRPC_SCHEME = "grpc://"
+
+class Result:
+    """Latencies (seconds), error and wrong-response counts of one scenario against one target."""
+
+    def __init__(self, scenario, elapsed, latencies, errors, mismatches=0):
+        self.scenario = scenario
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.mismatches = mismatches
+
+    @property
+    def throughput(self):
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q):
+        if not self.latencies:
+            return float('nan')
+        index = min(len(self.latencies) - 1, int(q / 100 * len(self.latencies)))
+        return self.latencies[index]
+
+    def summary(self):
+        return {
+            'scenario': self.scenario,
+            'count': len(self.latencies),
+            'errors': self.errors,
+            'mismatches': self.mismatches,
+            'throughput': self.throughput,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+def add_worker(base_url, deadline, latencies, errors, mismatches):
+    """One keep-alive HTTP client posting random additions until the deadline."""
+    session = httpx.Client(headers=HEADERS, **http_client_options(base_url, httpx.Limits(max_connections=1)))
+    while time.monotonic() < deadline:
+        a = random.randint(-1000, 1000)
+        b = random.randint(-1000, 1000)
+        payload = simple_math_pb2.AddRequest(a=a, b=b).SerializeToString()
+        started = time.perf_counter()
+        try:
+            response = session.post("/add", content=payload)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - started)
+        add_resp = simple_math_pb2.AddResponse()
+        add_resp.ParseFromString(response.content)
+        if add_resp.result != a + b:
+            mismatches.append(1)
+    session.close()
+
+def grpc_add_worker(base_url, deadline, latencies, errors, mismatches):
+    """add_worker for a grpc:// target: unary Add calls on one channel."""
+    import grpc
+    from wscat.server.grpc_server import simple_math_pb2_grpc
+
+    with grpc.insecure_channel(base_url[len(GRPC_SCHEME):]) as channel:
+        stub = simple_math_pb2_grpc.SimpleMathStub(channel)
+        while time.monotonic() < deadline:
+            a = random.randint(-1000, 1000)
+            b = random.randint(-1000, 1000)
+            started = time.perf_counter()
+            try:
+                response = stub.Add(simple_math_pb2.AddRequest(a=a, b=b))
+            except grpc.RpcError:
+                errors.append(1)
+                continue
+            latencies.append(time.perf_counter() - started)
+            if response.result != a + b:
+                mismatches.append(1)
+
+def bench_add(base_url, clients, duration):
+    latencies, errors, mismatches = [], [], []
+    deadline = time.monotonic() + duration
+    worker = grpc_add_worker if base_url.startswith(GRPC_SCHEME) else add_worker
+    threads = [
+        threading.Thread(target=worker, args=(base_url, deadline, latencies, errors, mismatches))
+        for _ in range(clients)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Result('/add', time.monotonic() - started, latencies, len(errors), len(mismatches))
+
+def _unexpected(response, correct):
+    """Whether a /math response disagrees with the answer it replies to."""
+    return response.HasField('congratulations') != correct
+
+async def math_session(base_url, deadline, wrong_rate, latencies, errors, mismatches):
+    """Play /math games back to back until the deadline, timing each turn."""
+    while time.monotonic() < deadline:
+        try:
+            async with connect_websocket(base_url, "/math") as websocket:
+                problem = simple_math_pb2.MathProblem()
+                problem.ParseFromString(await websocket.recv())
+                while True:
+                    answer = problem.a + problem.b
+                    if random.random() < wrong_rate and time.monotonic() < deadline:
+                        answer = -1
+                    started = time.perf_counter()
+                    await websocket.send(simple_math_pb2.MathSolution(answer=answer).SerializeToString())
+                    response = simple_math_pb2.MathResponse()
+                    response.ParseFromString(await websocket.recv())
+                    latencies.append(time.perf_counter() - started)
+                    if _unexpected(response, answer == problem.a + problem.b):
+                        mismatches.append(1)
+                    if response.HasField('congratulations'):
+                        break
+                    problem = response.new_problem
+        except (OSError, websockets.exceptions.WebSocketException):
+            errors.append(1)
+
+async def grpc_math_session(base_url, deadline, wrong_rate, latencies, errors, mismatches):
+    """math_session for a grpc:// target: MathGame streams on one channel."""
+    import grpc
+    from wscat.server.grpc_server import simple_math_pb2_grpc
+
+    async with grpc.aio.insecure_channel(base_url[len(GRPC_SCHEME):]) as channel:
+        stub = simple_math_pb2_grpc.SimpleMathStub(channel)
+        while time.monotonic() < deadline:
+            try:
+                call = stub.MathGame()
+                response = await call.read()
+                if response is grpc.aio.EOF:
+                    # The server closed the stream without a first problem
+                    errors.append(1)
+                    continue
+                problem = response.new_problem
+                while True:
+                    answer = problem.a + problem.b
+                    if random.random() < wrong_rate and time.monotonic() < deadline:
+                        answer = -1
+                    started = time.perf_counter()
+                    await call.write(simple_math_pb2.MathSolution(answer=answer))
+                    response = await call.read()
+                    if response is grpc.aio.EOF:
+                        errors.append(1)
+                        break
+                    latencies.append(time.perf_counter() - started)
+                    if _unexpected(response, answer == problem.a + problem.b):
+                        mismatches.append(1)
+                    if response.HasField('congratulations'):
+                        break
+                    problem = response.new_problem
+                await call.done_writing()
+            except grpc.RpcError:
+                errors.append(1)
+
+async def bench_math(base_url, sessions, duration, wrong_rate):
+    latencies, errors, mismatches = [], [], []
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    session = grpc_math_session if base_url.startswith(GRPC_SCHEME) else math_session
+    await asyncio.gather(*(
+        session(base_url, deadline, wrong_rate, latencies, errors, mismatches) for _ in range(sessions)
+    ))
+    return Result('/math turn', time.monotonic() - started, latencies, len(errors), len(mismatches))
+
+def run_target(base_url, args):
+    results = []
+    if args.clients:
+        results.append(bench_add(base_url, args.clients, args.duration))
+    if args.sessions:
+        results.append(asyncio.run(bench_math(base_url, args.sessions, args.duration, args.wrong_rate)))
+    return results
+
+# (label, summary key, format, scale) of each line of the report
+REPORT_ROWS = [
+    ('req/s', 'throughput', '{:.0f}', 1),
+    ('p50 ms', 'p50', '{:.3f}', 1e3),
+    ('p95 ms', 'p95', '{:.3f}', 1e3),
+    ('p99 ms', 'p99', '{:.3f}', 1e3),
+    ('errors', 'errors', '{:d}', 1),
+    ('mismatches', 'mismatches', '{:d}', 1),
+]
+
+def print_report(report, rows=REPORT_ROWS):
+    names = list(report)
+    scenarios = [result['scenario'] for result in report[names[0]]]
+    width = max(12, *(len(name) for name in names)) + 2
+    print(f"{'':<18}" + "".join(f"{name:>{width}}" for name in names))
+    for index, scenario in enumerate(scenarios):
+        print(scenario)
+        for label, key, fmt, scale in rows:
+            cells = []
+            for name in names:
+                value = report[name][index][key]
+                cells.append(fmt.format(value * scale if scale != 1 else value))
+            print(f"  {label:<16}" + "".join(f"{cell:>{width}}" for cell in cells))
+        if len(names) > 1:
+            first = report[names[0]][index]['throughput']
+            ratios = [report[name][index]['throughput'] / first if first else float('nan') for name in names]
+            print(f"  {'vs ' + names[0]:<16}" + "".join(f"{ratio:>{width - 1}.2f}x" for ratio in ratios))
+
+def parse_target(spec):
+    name, sep, url = spec.partition('=')
+    if not sep:
+        name, url = spec, spec
+    return name, url.rstrip('/')
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark wscat servers.")
+    parser.add_argument("--target", action="append", type=parse_target, metavar="NAME=URL",
+                        help="server to benchmark, repeatable (default: http://127.0.0.1:8000)")
+    parser.add_argument("--clients", type=int, default=8,
+                        help="concurrent keep-alive HTTP clients for /add (0 to skip)")
+    parser.add_argument("--sessions", type=int, default=32,
+                        help="concurrent WebSocket sessions for /math (0 to skip)")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds per scenario and target")
+    parser.add_argument("--wrong-rate", type=float, default=0.8,
+                        help="probability of a wrong answer, which keeps a game going")
+    parser.add_argument("--json", metavar="PATH",
+                        help="also write the report as JSON")
+    args = parser.parse_args()
+    targets = args.target or [parse_target("http://127.0.0.1:8000")]
+
+    report = {}
+    for name, url in targets:
+        print(f"Benchmarking {name} ({url}) ...", file=sys.stderr)
+        report[name] = [result.summary() for result in run_target(url, args)]
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
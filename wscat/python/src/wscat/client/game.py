@@ -1,55 +1,109 @@
+import argparse
 import asyncio
+import random
+import time
 import websockets
 import sys
-from wscat.server import simple_math_pb2
+from wscat.client.transport import connect_websocket, unix_socket_path
+from wscat.codec import CODECS, ProtobufCodec, get_codec
 
-async def handle_initial_problem(websocket, data):
+DEFAULT_URI = "ws://127.0.0.1:8000/math"
+# The server refuses /math?pipeline=K beyond this
+MAX_PIPELINE = 64
+
+def connect(uri, query=""):
+    """Open /math at `uri`: a ws:// URL of the endpoint, or unix:SOCKET."""
+    if unix_socket_path(uri) is not None:
+        return connect_websocket(uri, "/math" + query)
+    return websockets.connect(uri + query)
+
+async def handle_initial_problem(websocket, data, codec=ProtobufCodec):
     """Handle initial math problem from server."""
-    problem = simple_math_pb2.MathProblem()
-    problem.ParseFromString(data)
-    print(f"Problem: {problem.a} + {problem.b} = ?")
+    a, b, _ = codec.decode_math_problem(data)
+    print(f"Problem: {a} + {b} = ?")
     
     answer = int(input("Your answer: "))
     
     # Send solution
-    solution = simple_math_pb2.MathSolution(answer=answer)
-    await websocket.send(solution.SerializeToString())
+    await websocket.send(codec.encode_math_solution(answer))
 
-async def handle_response(websocket, data):
+async def handle_response(websocket, data, codec=ProtobufCodec):
     """Handle MathResponse from server (congratulations or new problem)."""
-    response = simple_math_pb2.MathResponse()
-    response.ParseFromString(data)
+    congratulations, new_problem, _ = codec.decode_math_response(data)
     
-    if response.HasField('congratulations'):
-        print(response.congratulations)
+    if congratulations is not None:
+        print(congratulations)
         return True
 
-    if response.HasField('new_problem'):
-        print(f"Wrong! New problem: {response.new_problem.a} + {response.new_problem.b} = ?")
+    if new_problem is not None:
+        print(f"Wrong! New problem: {new_problem[0]} + {new_problem[1]} = ?")
         answer = int(input("Your answer: "))
         # Send solution
-        solution = simple_math_pb2.MathSolution(answer=answer)
-        await websocket.send(solution.SerializeToString())
+        await websocket.send(codec.encode_math_solution(answer))
 
     return False
     
-async def game_client():
-    uri = "ws://127.0.0.1:8000/math"
-    
+async def game_client(uri, codec=ProtobufCodec):
     try:
-        async with websockets.connect(uri) as websocket:
+        async with connect(uri) as websocket:
             data = await websocket.recv()
-            await handle_initial_problem(websocket, data)
+            await handle_initial_problem(websocket, data, codec)
             while True:
               data = await websocket.recv()
-              if await handle_response(websocket, data):
+              if await handle_response(websocket, data, codec):
                 break
                         
     except websockets.exceptions.ConnectionClosed:
         print("Connection closed by server")
 
+async def send_answer(websocket, codec, problem, wrong_rate):
+    """Answer `problem` (a, b, id), deliberately wrong with probability `wrong_rate`."""
+    a, b, id = problem
+    answer = a + b
+    if random.random() < wrong_rate:
+        answer += 1
+    await websocket.send(codec.encode_math_solution(answer, id))
+
+async def pipelined_solver(uri, depth, wrong_rate, codec=ProtobufCodec):
+    """Headless bot: keep `depth` problems in flight, answer them out of order."""
+    started = time.perf_counter()
+    turns = 0
+    async with connect(uri, f"?pipeline={depth}") as websocket:
+        problems = [codec.decode_math_problem(await websocket.recv()) for _ in range(depth)]
+        random.shuffle(problems)
+        for problem in problems:
+            await send_answer(websocket, codec, problem, wrong_rate)
+
+        solved = 0
+        while solved < depth:
+            congratulations, new_problem, _ = codec.decode_math_response(await websocket.recv())
+            turns += 1
+            if congratulations is not None:
+                solved += 1
+            else:
+                await send_answer(websocket, codec, new_problem, wrong_rate)
+
+    elapsed = time.perf_counter() - started
+    print(f"Solved {solved} problems in {turns} turns, {elapsed:.3f}s ({turns / elapsed:.0f} turns/s)")
+
 def main():
-    asyncio.run(game_client())
+    parser = argparse.ArgumentParser(description="Play the wscat math game.")
+    parser.add_argument("--uri", default=DEFAULT_URI, help="WebSocket URI of /math, or unix:SOCKET")
+    parser.add_argument("--pipeline", type=int, metavar="K",
+                        help=f"solve headlessly with K problems in flight, 1..{MAX_PIPELINE} (pipelined protocol)")
+    parser.add_argument("--wrong-rate", type=float, default=0.0,
+                        help="with --pipeline: probability of answering wrong, to play longer games")
+    parser.add_argument("--codec", choices=sorted(CODECS), default="protobuf",
+                        help="wire format codec")
+    args = parser.parse_args()
+    if args.pipeline is not None and not 1 <= args.pipeline <= MAX_PIPELINE:
+        parser.error(f"--pipeline must be 1..{MAX_PIPELINE}")
+
+    codec = get_codec(args.codec)
+    if args.pipeline:
+        asyncio.run(pipelined_solver(args.uri, args.pipeline, args.wrong_rate, codec))
+    else:
+        asyncio.run(game_client(args.uri, codec))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,278 @@
+"""Replay captured wscat traffic against one or more servers.
+
+Record with the server's WSCAT_CAPTURE (see wscat.server.capture), then:
+
+    WSCAT_CAPTURE=traffic.wcap doit run_server
+    uv run wscat-replay traffic.wcap --speed 10 \\
+                        --target python=http://127.0.0.1:8000 \\
+                        --target rust=http://127.0.0.1:8001
+
+Requests and sessions start at their recorded offsets divided by --speed;
+`--speed max` sends everything as fast as --concurrency allows. /add
+responses must equal the recorded ones byte for byte. /math problems are
+random, so a session is replayed by its shape: each solution is right or
+wrong as it was in the capture, and each response must be of the recorded
+kind (congratulations or new problem) and carry the recorded id.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+import httpx
+import websockets
+from google.protobuf.message import DecodeError
+from wscat.client.transport import connect_websocket, http_client_options
+from wscat.client.bench import HEADERS, Result, parse_target, print_report
+from wscat.codec import ProtobufCodec
+from wscat.server.capture import (
+    ADD_REQUEST, ADD_RESPONSE, MATH_IN, MATH_OPEN, MATH_OUT, STATUS, CaptureReader,
+)
+
+class AddCall:
+    """One recorded POST /add and the response the server gave."""
+
+    def __init__(self, timestamp, body):
+        self.timestamp = timestamp
+        self.body = body
+        self.status = None
+        self.response = None
+
+class MathSession:
+    """One recorded /math connection, reduced to what a replay needs.
+
+    `solutions` holds (timestamp, frame, id, correct) per client frame, where
+    `correct` is None if the frame was not a solution to a known problem;
+    `responses` holds the recorded (kind, id) of every server response.
+    """
+
+    def __init__(self, timestamp, query):
+        self.timestamp = timestamp
+        self.query = query
+        self.initial = 0  # problems sent before the first solution
+        self.solutions = []
+        self.responses = []
+        self.problems = {}  # id -> expected answer, while reading the log
+
+    def client_frame(self, timestamp, frame, codec):
+        try:
+            answer, id = codec.decode_math_solution(frame)
+        except DecodeError:
+            self.solutions.append((timestamp, frame, None, None))
+            return
+        expected = self.problems.pop(id, None)
+        correct = None if expected is None else answer == expected
+        self.solutions.append((timestamp, frame, id, correct))
+
+    def server_frame(self, frame, codec):
+        try:
+            if not self.solutions:
+                a, b, id = codec.decode_math_problem(frame)
+                self.problems[id] = a + b
+                self.initial += 1
+                return
+            congratulations, problem, id = codec.decode_math_response(frame)
+        except DecodeError:
+            return
+        if problem is not None:
+            a, b, problem_id = problem
+            self.problems[problem_id] = a + b
+        self.responses.append(("new_problem" if congratulations is None else "congratulations", id))
+
+def load(paths, codec=ProtobufCodec):
+    """Recorded /add calls and /math sessions of all `paths`, in start order."""
+    calls = []
+    sessions = []
+    for path in paths:
+        # Session ids restart with the server, so they only name the most
+        # recent request or connection that opened with them.
+        open_calls = {}
+        open_sessions = {}
+        with CaptureReader(path) as reader:
+            for timestamp, session, kind, payload in reader:
+                if kind == ADD_REQUEST:
+                    call = open_calls[session] = AddCall(timestamp, bytes(payload))
+                    calls.append(call)
+                elif kind == ADD_RESPONSE and session in open_calls:
+                    call = open_calls.pop(session)
+                    call.status, = STATUS.unpack_from(payload)
+                    call.response = bytes(payload[STATUS.size:])
+                elif kind == MATH_OPEN:
+                    math = open_sessions[session] = MathSession(timestamp, bytes(payload).decode())
+                    sessions.append(math)
+                elif kind == MATH_IN and session in open_sessions:
+                    open_sessions[session].client_frame(timestamp, bytes(payload), codec)
+                elif kind == MATH_OUT and session in open_sessions:
+                    open_sessions[session].server_frame(payload, codec)
+                del payload
+            if reader.truncated:
+                print(f"{path}: ignoring a truncated record at the end", file=sys.stderr)
+    calls.sort(key=lambda call: call.timestamp)
+    sessions.sort(key=lambda session: session.timestamp)
+    return calls, sessions
+
+class Replay:
+    """Replays loaded traffic against one server and collects the results."""
+
+    def __init__(self, base_url, calls, sessions, speed, concurrency, timeout, codec=ProtobufCodec):
+        self.base_url = base_url
+        self.calls = calls
+        self.sessions = sessions
+        self.speed = speed
+        self.timeout = timeout
+        self.codec = codec
+        self.slots = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        timestamps = [item.timestamp for item in calls[:1] + sessions[:1]]
+        self.origin = min(timestamps) if timestamps else 0
+        self.behind = 0.0  # worst lateness of a start against the schedule
+        self.add_latencies, self.add_errors, self.add_mismatches = [], 0, 0
+        self.turn_latencies, self.math_errors, self.math_mismatches = [], 0, 0
+
+    async def wait_until(self, timestamp):
+        due = self.started + (timestamp - self.origin) / 1e9 / self.speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            self.behind = max(self.behind, -delay)
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(headers=HEADERS, timeout=self.timeout,
+                                     **http_client_options(self.base_url, limits, asynchronous=True)) as http:
+            events = sorted(
+                [(call.timestamp, self.add, (http, call)) for call in self.calls]
+                + [(session.timestamp, self.math, (session,)) for session in self.sessions],
+                key=lambda event: event[0],
+            )
+            tasks = set()
+            self.started = time.perf_counter()
+            for timestamp, replay, args in events:
+                await self.wait_until(timestamp)
+                await self.slots.acquire()
+                task = asyncio.create_task(replay(*args))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - self.started
+        return [
+            Result('/add', elapsed, self.add_latencies, self.add_errors, self.add_mismatches),
+            Result('/math turn', elapsed, self.turn_latencies, self.math_errors, self.math_mismatches),
+        ]
+
+    async def add(self, http, call):
+        try:
+            started = time.perf_counter()
+            response = await http.post("/add", content=call.body)
+            self.add_latencies.append(time.perf_counter() - started)
+            if call.status is not None and (
+                    response.status_code != call.status or response.content != call.response):
+                self.add_mismatches += 1
+        except httpx.HTTPError:
+            self.add_errors += 1
+        finally:
+            self.slots.release()
+
+    async def math(self, session):
+        path = "/math" + (f"?{session.query}" if session.query else "")
+        try:
+            async with connect_websocket(self.base_url, path) as websocket:
+                await self.play(websocket, session)
+        except (OSError, asyncio.TimeoutError, DecodeError, websockets.exceptions.WebSocketException):
+            self.math_errors += 1
+        finally:
+            self.slots.release()
+
+    async def play(self, websocket, session):
+        codec = self.codec
+        problems = {}  # live id -> answer, filled by the receiver
+        arrived = asyncio.Condition()
+        sent = deque()  # send time of every unanswered solution
+
+        async def recv():
+            return await asyncio.wait_for(websocket.recv(), self.timeout)
+
+        async def learn(id, answer):
+            async with arrived:
+                problems[id] = answer
+                arrived.notify_all()
+
+        async def receiver():
+            for _ in range(session.initial):
+                a, b, id = codec.decode_math_problem(await recv())
+                await learn(id, a + b)
+            for kind, id in session.responses:
+                frame = await recv()
+                self.turn_latencies.append(time.perf_counter() - sent.popleft())
+                congratulations, problem, response_id = codec.decode_math_response(frame)
+                if problem is not None:
+                    await learn(problem[2], problem[0] + problem[1])
+                actual = "new_problem" if congratulations is None else "congratulations"
+                if (actual, response_id) != (kind, id):
+                    self.math_mismatches += 1
+
+        receiving = asyncio.create_task(receiver())
+        try:
+            for timestamp, frame, id, correct in session.solutions:
+                await self.wait_until(timestamp)
+                if correct is not None:
+                    async with arrived:
+                        await asyncio.wait_for(arrived.wait_for(lambda: id in problems), self.timeout)
+                        answer = problems.pop(id)
+                    frame = codec.encode_math_solution(answer if correct else answer + 1, id)
+                sent.append(time.perf_counter())
+                await websocket.send(frame)
+            await receiving
+        finally:
+            receiving.cancel()
+
+def parse_speed(value):
+    if value == "max":
+        return float("inf")
+    speed = float(value)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured wscat traffic.")
+    parser.add_argument("logs", nargs="+", metavar="LOG",
+                        help="capture files written with WSCAT_CAPTURE (one per worker is fine)")
+    parser.add_argument("--target", action="append", type=parse_target, metavar="NAME=URL",
+                        help="server to replay against, repeatable (default: http://127.0.0.1:8000)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0,
+                        help="time compression factor, or 'max' to ignore recorded timing")
+    parser.add_argument("--concurrency", type=int, default=256,
+                        help="maximum /add requests and /math sessions in flight")
+    parser.add_argument("--timeout", type=float, default=5.0,
+                        help="seconds to wait for any single response")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+    targets = args.target or [parse_target("http://127.0.0.1:8000")]
+
+    try:
+        calls, sessions = load(args.logs)
+    except ValueError as e:
+        parser.error(str(e))
+    turns = sum(len(session.solutions) for session in sessions)
+    print(f"Loaded {len(calls)} /add requests and {len(sessions)} /math sessions "
+          f"({turns} turns)", file=sys.stderr)
+
+    report = {}
+    for name, url in targets:
+        print(f"Replaying against {name} ({url}) ...", file=sys.stderr)
+        replay = Replay(url, calls, sessions, args.speed, args.concurrency, args.timeout)
+        report[name] = [result.summary() for result in asyncio.run(replay.run())]
+        if args.speed != float("inf") and replay.behind > 0.01:
+            print(f"  fell up to {replay.behind * 1e3:.0f} ms behind the recorded schedule",
+                  file=sys.stderr)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
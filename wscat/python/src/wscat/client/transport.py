@@ -0,0 +1,39 @@
+"""Connection helpers shared by the clients: TCP URLs or a Unix domain socket.
+
+Anywhere a client takes a server URL it also accepts `unix:/path/to.sock`,
+for a server started with `wscat-serve --uds /path/to.sock`. Requests over
+the socket carry the same paths and a Host of "localhost".
+"""
+import httpx
+import websockets
+
+UNIX_SCHEME = "unix:"
+UNIX_BASE_URL = "http://localhost"
+
+def unix_socket_path(url):
+    """Socket path of a `unix:` URL, None for any other URL."""
+    if url.startswith(UNIX_SCHEME):
+        return url[len(UNIX_SCHEME):]
+    return None
+
+def http_client_options(base_url, limits, asynchronous=False, http2=False):
+    """Keyword arguments for httpx.Client/AsyncClient talking to `base_url`.
+
+    With `http2` the client speaks HTTP/2 by prior knowledge (h2c), so every
+    request becomes a stream on a shared connection; this needs the h2
+    package (the `http2` extra).
+    """
+    versions = {"http1": False, "http2": True} if http2 else {}
+    socket_path = unix_socket_path(base_url)
+    if socket_path is None:
+        return {"base_url": base_url, "limits": limits, **versions}
+    transport_class = httpx.AsyncHTTPTransport if asynchronous else httpx.HTTPTransport
+    transport = transport_class(uds=socket_path, limits=limits, **versions)
+    return {"base_url": UNIX_BASE_URL, "transport": transport}
+
+def connect_websocket(base_url, path, **kwargs):
+    """websockets connect() for `path` (with any query) on the server at `base_url`."""
+    socket_path = unix_socket_path(base_url)
+    if socket_path is not None:
+        return websockets.unix_connect(socket_path, UNIX_BASE_URL.replace("http", "ws", 1) + path, **kwargs)
+    return websockets.connect(base_url.replace("http", "ws", 1).rstrip("/") + path, **kwargs)
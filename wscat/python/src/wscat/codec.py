@@ -0,0 +1,368 @@
+"""Encoders and decoders for the simple_math.proto messages.
+
+Two interchangeable codecs share one API of plain functions on bytes:
+
+* `ProtobufCodec` goes through the generated simple_math_pb2 classes.
+* `FastCodec` reads and writes the wire format directly. It works on
+  `bytes` or `memoryview` input, returns plain ints/tuples and never builds
+  a message object. Its output is byte-for-byte what protoc's code emits
+  (fields in number order, proto3 defaults omitted) and it parses anything
+  protoc's code parses, skipping unknown fields (groups included) the same way.
+
+FastCodec is quicker than the upb runtime when fields are small
+non-negative ints, which is every /math frame; a negative int32 is a
+10-byte varint and costs it more than protobuf takes for the whole
+message. tools/check_codec.py times both. WSCAT_CODEC defaults to protobuf.
+
+Decoders return tuples in field order:
+
+    decode_add_request(data)   -> (a, b)
+    decode_add_response(data)  -> result
+    decode_math_problem(data)  -> (a, b, id)
+    decode_math_solution(data) -> (answer, id)
+    decode_math_response(data) -> (congratulations or None, (a, b, id) or None, id)
+
+Both raise google.protobuf.message.DecodeError on malformed input, and the
+encoders raise ValueError for values out of the field's range.
+"""
+import os
+from google.protobuf.message import DecodeError
+from wscat.server import simple_math_pb2
+
+INT32_MIN = -2**31
+INT32_MAX = 2**31 - 1
+UINT32_MAX = 2**32 - 1
+UINT64_MASK = 2**64 - 1
+
+WIRE_VARINT = 0
+WIRE_FIXED64 = 1
+WIRE_LENGTH = 2
+WIRE_START_GROUP = 3
+WIRE_END_GROUP = 4
+WIRE_FIXED32 = 5
+# Nesting of unknown groups the decoders skip, as protobuf's recursion limit
+MAX_GROUP_DEPTH = 100
+
+# Single-byte varints, so small values are looked up instead of allocated.
+_SMALL = [bytes((value,)) for value in range(0x80)]
+# Last five bytes of every negative int32 on the wire (bits 35-63 set).
+_NEGATIVE_INT32_TAIL = b"\xff\xff\xff\xff\x01"
+_NEGATIVE_INT32_HIGH = 0xfffffff800000000
+
+def encode_varint(value):
+    """Varint bytes of a non-negative int below 2**64."""
+    if value < 0x80:
+        return _SMALL[value]
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def decode_varint(data, pos):
+    """Return (value, position after the varint) for the varint at `pos`."""
+    try:
+        byte = data[pos]
+        if byte < 0x80:
+            return byte, pos + 1
+        result = byte & 0x7f
+        # A negative int32 is ten bytes whose last five never change: read
+        # the first five and take the sign extension as given.
+        if (data[pos + 5:pos + 10] == _NEGATIVE_INT32_TAIL
+                and data[pos + 1] & data[pos + 2] & data[pos + 3] & data[pos + 4] & 0x80):
+            return (result | (data[pos + 1] & 0x7f) << 7 | (data[pos + 2] & 0x7f) << 14
+                    | (data[pos + 3] & 0x7f) << 21 | (data[pos + 4] & 0x7f) << 28
+                    | _NEGATIVE_INT32_HIGH), pos + 10
+        shift = 7
+        while True:
+            pos += 1
+            byte = data[pos]
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result & UINT64_MASK, pos + 1
+            shift += 7
+            if shift >= 70:
+                raise DecodeError("Varint longer than 10 bytes")
+    except IndexError:
+        raise DecodeError("Truncated varint") from None
+
+def _int32_field(tag, value):
+    if not INT32_MIN <= value <= INT32_MAX:
+        raise ValueError(f"Value out of range for int32: {value}")
+    if not value:
+        return b""
+    if value < 0:
+        # Sign-extended to 64 bits on the wire: five bytes of value, then a fixed tail
+        return tag + bytes(((value & 0x7f) | 0x80, (value >> 7 & 0x7f) | 0x80, (value >> 14 & 0x7f) | 0x80,
+                            (value >> 21 & 0x7f) | 0x80, (value >> 28 & 0x7f) | 0x80)) + _NEGATIVE_INT32_TAIL
+    return tag + encode_varint(value)
+
+def _uint32_field(tag, value):
+    if not 0 <= value <= UINT32_MAX:
+        raise ValueError(f"Value out of range for uint32: {value}")
+    return tag + encode_varint(value) if value else b""
+
+def _as_int32(value):
+    value &= 0xffffffff
+    return value - 0x100000000 if value > INT32_MAX else value
+
+def _skip_field(data, pos, tag, depth=0):
+    """Position after the payload of an unknown field."""
+    wire_type = tag & 7
+    if wire_type == WIRE_VARINT:
+        return decode_varint(data, pos)[1]
+    if wire_type == WIRE_FIXED64:
+        pos += 8
+    elif wire_type == WIRE_LENGTH:
+        size, pos = decode_varint(data, pos)
+        pos += size
+    elif wire_type == WIRE_FIXED32:
+        pos += 4
+    elif wire_type == WIRE_START_GROUP:
+        if depth >= MAX_GROUP_DEPTH:
+            raise DecodeError("Groups nested too deeply")
+        end_tag = tag - WIRE_START_GROUP + WIRE_END_GROUP
+        while True:
+            inner, pos = _read_tag(data, pos)
+            if inner == end_tag:
+                return pos
+            pos = _skip_field(data, pos, inner, depth + 1)
+    else:
+        raise DecodeError(f"Unsupported wire type {wire_type}")
+    if pos > len(data):
+        raise DecodeError("Truncated message")
+    return pos
+
+def _read_tag(data, pos):
+    tag, pos = decode_varint(data, pos)
+    if tag >> 3 == 0 or tag > 0xffffffff:
+        raise DecodeError(f"Invalid tag {tag}")
+    return tag, pos
+
+def _decode_varint_fields(data, f1=0, f2=0, f3=0):
+    """Raw values of varint fields 1-3, later occurrences winning; others skipped.
+
+    Single-byte tags and one- or two-byte values, by far the common case,
+    are read inline.
+    """
+    pos = 0
+    end = len(data)
+    try:
+        while pos < end:
+            tag = data[pos]
+            if tag == 0x08 or tag == 0x10 or tag == 0x18:
+                value = data[pos + 1]
+                if value < 0x80:
+                    pos += 2
+                elif data[pos + 2] < 0x80:
+                    value = (value & 0x7f) | data[pos + 2] << 7
+                    pos += 3
+                else:
+                    value, pos = decode_varint(data, pos + 1)
+                if tag == 0x08:
+                    f1 = value
+                elif tag == 0x10:
+                    f2 = value
+                else:
+                    f3 = value
+            else:
+                tag, pos = _read_tag(data, pos)
+                pos = _skip_field(data, pos, tag)
+    except IndexError:
+        raise DecodeError("Truncated message") from None
+    return f1, f2, f3
+
+_TAG1 = b"\x08"
+_TAG2 = b"\x10"
+_TAG3 = b"\x18"
+# Encoded messages with field 1 in 1..127: b"\x08" and the value byte.
+_FIELD1_SMALL = [_TAG1 + small for small in _SMALL]
+
+def _small_pair(data):
+    """(field 1, field 2) when `data` is just those two varint fields, both
+    in 1..127, else None. Most /add requests and /math solutions are."""
+    if len(data) == 4 and data[0] == 0x08 and data[2] == 0x10:
+        first = data[1]
+        second = data[3]
+        if first < 0x80 and second < 0x80:
+            return first, second
+    return None
+
+class FastCodec:
+    """Hand-written wire format codec; see the module docstring."""
+
+    name = "fast"
+
+    @staticmethod
+    def encode_add_request(a, b):
+        return _int32_field(_TAG1, a) + _int32_field(_TAG2, b)
+
+    @staticmethod
+    def decode_add_request(data):
+        pair = _small_pair(data)
+        if pair is not None:
+            return pair
+        a, b, _ = _decode_varint_fields(data)
+        if a > INT32_MAX:
+            a = _as_int32(a)
+        if b > INT32_MAX:
+            b = _as_int32(b)
+        return a, b
+
+    @staticmethod
+    def encode_add_response(result):
+        # One- and two-byte varints inline, the rest through _int32_field
+        if 0 < result < 0x4000:
+            if result < 0x80:
+                return _FIELD1_SMALL[result]
+            return bytes((0x08, (result & 0x7f) | 0x80, result >> 7))
+        return _int32_field(_TAG1, result)
+
+    @staticmethod
+    def decode_add_response(data):
+        return _as_int32(_decode_varint_fields(data)[0])
+
+    @staticmethod
+    def encode_math_problem(a, b, id=0):
+        return _int32_field(_TAG1, a) + _int32_field(_TAG2, b) + _uint32_field(_TAG3, id)
+
+    @staticmethod
+    def decode_math_problem(data):
+        a, b, id = _decode_varint_fields(data)
+        return _as_int32(a), _as_int32(b), id & 0xffffffff
+
+    @staticmethod
+    def encode_math_solution(answer, id=0):
+        return _int32_field(_TAG1, answer) + _uint32_field(_TAG2, id)
+
+    @staticmethod
+    def decode_math_solution(data):
+        pair = _small_pair(data)
+        if pair is not None:
+            return pair
+        answer, id, _ = _decode_varint_fields(data)
+        if answer > INT32_MAX:
+            answer = _as_int32(answer)
+        return answer, id & 0xffffffff
+
+    @staticmethod
+    def encode_congratulations(text, id=0):
+        payload = text.encode("utf-8")
+        # A set oneof member is serialized even when it is the empty string.
+        return b"\x0a" + encode_varint(len(payload)) + payload + _uint32_field(_TAG3, id)
+
+    @staticmethod
+    def encode_new_problem(a, b, problem_id=0, id=0):
+        problem = FastCodec.encode_math_problem(a, b, problem_id)
+        return b"\x12" + encode_varint(len(problem)) + problem + _uint32_field(_TAG3, id)
+
+    @staticmethod
+    def decode_math_response(data):
+        congratulations = None
+        problem = None
+        id = 0
+        pos = 0
+        end = len(data)
+        while pos < end:
+            tag, pos = _read_tag(data, pos)
+            if tag == 0x18:
+                id, pos = decode_varint(data, pos)
+            elif tag in (0x0a, 0x12):
+                size, pos = decode_varint(data, pos)
+                if pos + size > end:
+                    raise DecodeError("Truncated message")
+                payload = data[pos:pos + size]
+                pos += size
+                if tag == 0x0a:
+                    try:
+                        congratulations = bytes(payload).decode("utf-8")
+                    except UnicodeDecodeError:
+                        raise DecodeError("Invalid UTF-8 in congratulations") from None
+                    problem = None
+                else:
+                    # Repeated occurrences of a message field are merged.
+                    previous = problem or (0, 0, 0)
+                    problem = _decode_varint_fields(payload, *previous)
+                    congratulations = None
+            else:
+                pos = _skip_field(data, pos, tag)
+        if problem is not None:
+            problem = (_as_int32(problem[0]), _as_int32(problem[1]), problem[2] & 0xffffffff)
+        return congratulations, problem, id & 0xffffffff
+
+class ProtobufCodec:
+    """The same API on top of the protoc-generated classes."""
+
+    name = "protobuf"
+
+    @staticmethod
+    def encode_add_request(a, b):
+        return simple_math_pb2.AddRequest(a=a, b=b).SerializeToString()
+
+    @staticmethod
+    def decode_add_request(data):
+        message = simple_math_pb2.AddRequest()
+        message.ParseFromString(data)
+        return message.a, message.b
+
+    @staticmethod
+    def encode_add_response(result):
+        return simple_math_pb2.AddResponse(result=result).SerializeToString()
+
+    @staticmethod
+    def decode_add_response(data):
+        message = simple_math_pb2.AddResponse()
+        message.ParseFromString(data)
+        return message.result
+
+    @staticmethod
+    def encode_math_problem(a, b, id=0):
+        return simple_math_pb2.MathProblem(a=a, b=b, id=id).SerializeToString()
+
+    @staticmethod
+    def decode_math_problem(data):
+        message = simple_math_pb2.MathProblem()
+        message.ParseFromString(data)
+        return message.a, message.b, message.id
+
+    @staticmethod
+    def encode_math_solution(answer, id=0):
+        return simple_math_pb2.MathSolution(answer=answer, id=id).SerializeToString()
+
+    @staticmethod
+    def decode_math_solution(data):
+        message = simple_math_pb2.MathSolution()
+        message.ParseFromString(data)
+        return message.answer, message.id
+
+    @staticmethod
+    def encode_congratulations(text, id=0):
+        return simple_math_pb2.MathResponse(congratulations=text, id=id).SerializeToString()
+
+    @staticmethod
+    def encode_new_problem(a, b, problem_id=0, id=0):
+        problem = simple_math_pb2.MathProblem(a=a, b=b, id=problem_id)
+        return simple_math_pb2.MathResponse(new_problem=problem, id=id).SerializeToString()
+
+    @staticmethod
+    def decode_math_response(data):
+        message = simple_math_pb2.MathResponse()
+        message.ParseFromString(data)
+        kind = message.WhichOneof("response_type")
+        congratulations = message.congratulations if kind == "congratulations" else None
+        problem = None
+        if kind == "new_problem":
+            problem = (message.new_problem.a, message.new_problem.b, message.new_problem.id)
+        return congratulations, problem, message.id
+
+CODECS = {codec.name: codec for codec in (ProtobufCodec, FastCodec)}
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec {name!r}, expected one of {sorted(CODECS)}")
+    return CODECS[name]
+
+def codec_from_env(environ=os.environ):
+    """The codec named by WSCAT_CODEC, protobuf by default."""
+    return get_codec(environ.get("WSCAT_CODEC", "protobuf"))
@@ -0,0 +1,191 @@
+"""Traffic capture: /add bodies and /math frames in an append-only binary log.
+
+Set WSCAT_CAPTURE to a file path to record what the server sees; wscat-replay
+plays a log back. A "{pid}" in the path is replaced by the process id, so
+every wscat-serve worker writes its own file; wscat-serve refuses to start
+more than one worker on a path without it, since their buffered writes
+would interleave in one file.
+
+The file starts with MAGIC and a format version. Each record is a fixed
+RECORD header followed by `length` payload bytes:
+
+    timestamp  u64  wall clock, ns since the epoch
+    session    u32  one id per /add request or /math connection
+    kind       u8   one of the KIND constants below
+    length     u32  payload size
+
+Payloads are the raw bodies and frames, except MATH_OPEN (the query string)
+and ADD_RESPONSE (the HTTP status as u16, then the body). A process killed
+mid-write leaves at most one truncated record at the end, which readers skip.
+"""
+import atexit
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"WSCATCAP"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sH")
+RECORD = struct.Struct("<QIBI")
+STATUS = struct.Struct("<H")
+
+ADD_REQUEST = 1
+ADD_RESPONSE = 2
+MATH_OPEN = 3
+MATH_IN = 4  # client to server
+MATH_OUT = 5  # server to client
+MATH_CLOSE = 6
+
+class CaptureLog:
+    """Appends records to a capture file through a write buffer."""
+
+    def __init__(self, path):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.file = open(self.path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        self.sessions = 0
+        self.records = 0
+        atexit.register(self.close)
+
+    def new_session(self):
+        self.sessions += 1
+        return self.sessions
+
+    def write(self, kind, session, payload=b""):
+        self.file.write(RECORD.pack(time.time_ns(), session, kind, len(payload)))
+        self.file.write(payload)
+        self.records += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+def capture_from_env(environ=os.environ):
+    """A CaptureLog writing to WSCAT_CAPTURE, or None when it is unset."""
+    path = environ.get("WSCAT_CAPTURE")
+    return CaptureLog(path) if path else None
+
+class CaptureMiddleware:
+    """ASGI middleware recording POST /add and the /math WebSocket to a CaptureLog.
+
+    It only observes the ASGI messages passing through; requests and
+    responses reach the wrapped app and the client unchanged.
+    """
+
+    def __init__(self, app, log):
+        self.app = app
+        self.log = log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/add" and scope["method"] == "POST":
+            return await self._capture_add(scope, receive, send)
+        if scope["type"] == "websocket" and scope["path"] == "/math":
+            return await self._capture_math(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+    async def _capture_add(self, scope, receive, send):
+        log = self.log
+        session = log.new_session()
+        request_body = []
+        response_body = []
+        status = 0
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    log.write(ADD_REQUEST, session, b"".join(request_body))
+            return message
+
+        async def capture_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    log.write(ADD_RESPONSE, session, STATUS.pack(status) + b"".join(response_body))
+            await send(message)
+
+        await self.app(scope, capture_receive, capture_send)
+
+    async def _capture_math(self, scope, receive, send):
+        log = self.log
+        session = log.new_session()
+        closed = False
+        log.write(MATH_OPEN, session, scope.get("query_string", b""))
+
+        def close():
+            nonlocal closed
+            if not closed:
+                closed = True
+                log.write(MATH_CLOSE, session)
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "websocket.receive":
+                data = message.get("bytes")
+                if data is None:
+                    data = message.get("text", "").encode()
+                log.write(MATH_IN, session, data)
+            elif message["type"] == "websocket.disconnect":
+                close()
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "websocket.send":
+                data = message.get("bytes")
+                if data is None:
+                    data = message.get("text", "").encode()
+                log.write(MATH_OUT, session, data)
+            elif message["type"] == "websocket.close":
+                close()
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            close()
+
+class CaptureReader:
+    """Memory-mapped, read-only view of a capture file.
+
+    Iterating yields (timestamp_ns, session, kind, payload) with `payload` a
+    memoryview into the mapping, so nothing is copied until a caller needs it.
+    Raises ValueError for a file that is not a capture log of this version.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a wscat capture log")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported capture format version {version}")
+        self.truncated = False
+
+    def __iter__(self):
+        data = memoryview(self.map)
+        end = len(data)
+        pos = FILE_HEADER.size
+        while pos + RECORD.size <= end:
+            timestamp, session, kind, length = RECORD.unpack_from(data, pos)
+            pos += RECORD.size
+            if pos + length > end:
+                break
+            yield timestamp, session, kind, data[pos:pos + length]
+            pos += length
+        self.truncated = pos != end
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
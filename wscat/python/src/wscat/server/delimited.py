@@ -0,0 +1,22 @@
+"""Length-delimited protobuf framing: each message prefixed by its size as a varint.
+
+This is the layout of protobuf's writeDelimitedTo()/parseDelimitedFrom(),
+used to carry several messages in one WebSocket frame on /add/stream.
+"""
+from google.protobuf.message import DecodeError
+from wscat.codec import decode_varint, encode_varint
+
+def encode_delimited(payloads):
+    """Join already-serialized messages into one length-delimited buffer."""
+    return b"".join(encode_varint(len(payload)) + payload for payload in payloads)
+
+def iter_delimited(data):
+    """Yield the serialized messages of a length-delimited buffer."""
+    data = memoryview(data)
+    pos = 0
+    while pos < len(data):
+        size, pos = decode_varint(data, pos)
+        if pos + size > len(data):
+            raise DecodeError("Truncated length-delimited message")
+        yield data[pos:pos + size]
+        pos += size
@@ -0,0 +1,140 @@
+"""asyncio gRPC server for the SimpleMath service in simple_math.proto.
+
+    uv run wscat-grpc --port 50051
+
+It speaks the protocols of the FastAPI app over gRPC: Add is POST /add,
+AddStream is /add/stream and MathGame is /math (pipelined when the call
+carries "wscat-pipeline: K" metadata). Needs the `grpc` extra.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import grpc
+from wscat.codec import INT32_MAX, INT32_MIN
+from . import simple_math_pb2
+try:
+    from . import simple_math_pb2_grpc
+except ImportError as e:
+    raise ImportError(f"{e}. The gRPC stubs are generated by `doit build_protos` when grpcio-tools "
+                      "is installed: install the grpc extra and rerun it.") from e
+from .logconfig import config_from_env, configure_logging, route_logger
+from .math_cache import CONGRATULATIONS, MathCache
+from .sessions import SessionTable
+
+PIPELINE_METADATA = "wscat-pipeline"
+# Same bound as /math?pipeline=K.
+MAX_PIPELINE = 64
+
+logger = logging.getLogger(__name__)
+math_logger = route_logger("grpc_math")
+
+def pipeline_depth(metadata):
+    """Problems in flight requested by the call metadata; 0 means lockstep."""
+    for key, value in metadata or ():
+        if key == PIPELINE_METADATA:
+            if not value.isdigit() or not 1 <= int(value) <= MAX_PIPELINE:
+                raise ValueError(f"{PIPELINE_METADATA} must be 1..{MAX_PIPELINE}, got {value!r}")
+            return int(value)
+    return 0
+
+class SimpleMathService(simple_math_pb2_grpc.SimpleMathServicer):
+
+    def __init__(self):
+        self.cache = MathCache()
+        self.sessions = SessionTable()
+
+    @staticmethod
+    async def _sum(request, context):
+        result = request.a + request.b
+        if not INT32_MIN <= result <= INT32_MAX:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{request.a} + {request.b} overflows int32")
+        return result
+
+    async def Add(self, request, context):
+        return simple_math_pb2.AddResponse(result=await self._sum(request, context))
+
+    async def AddStream(self, request_iterator, context):
+        async for request in request_iterator:
+            yield simple_math_pb2.AddResponse(result=await self._sum(request, context))
+
+    def _new_problem(self, index, problem_id, id=0):
+        a, b = self.cache.operands[index]
+        problem = simple_math_pb2.MathProblem(a=a, b=b, id=problem_id)
+        return simple_math_pb2.MathResponse(new_problem=problem, id=id)
+
+    async def MathGame(self, request_iterator, context):
+        """/math over a stream; lockstep games use id 0 throughout."""
+        try:
+            depth = pipeline_depth(context.invocation_metadata())
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+        cache = self.cache
+        sessions = self.sessions
+        outstanding = {}  # problem id -> index into cache
+        next_id = 1 if depth else 0
+        for _ in range(depth or 1):
+            problem = cache.random_index()
+            outstanding[next_id] = problem
+            yield self._new_problem(problem, next_id)
+            next_id += 1 if depth else 0
+
+        slot = sessions.open(problem)
+        solved = False
+        try:
+            async for solution in request_iterator:
+                problem = outstanding.pop(solution.id, None)
+                if problem is None:
+                    await context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                        f"no open problem with id {solution.id}")
+                sessions.turns[slot] += 1
+                if solution.answer == cache.answers[problem]:
+                    yield simple_math_pb2.MathResponse(congratulations=CONGRATULATIONS, id=solution.id)
+                    if not outstanding:
+                        solved = True
+                        return
+                else:
+                    problem = cache.random_index()
+                    sessions.problem[slot] = problem
+                    outstanding[next_id] = problem
+                    yield self._new_problem(problem, next_id, solution.id)
+                    next_id += 1 if depth else 0
+        finally:
+            turns = sessions.turns[slot]
+            duration = sessions.close(slot)
+            math_logger.info("MathGame closed: turns=%d solved=%s duration=%.3fs", turns, solved, duration)
+
+async def serve(addresses, graceful_timeout):
+    server = grpc.aio.server()
+    simple_math_pb2_grpc.add_SimpleMathServicer_to_server(SimpleMathService(), server)
+    for address in addresses:
+        server.add_insecure_port(address)
+    await server.start()
+    logger.info("gRPC SimpleMath serving on %s", ", ".join(addresses))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    logger.info("Shutting down, letting calls finish for up to %.0fs", graceful_timeout)
+    await server.stop(graceful_timeout)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the SimpleMath gRPC service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument("--uds", metavar="PATH", help="also serve on a Unix domain socket at PATH")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="seconds to let open calls finish on shutdown")
+    args = parser.parse_args()
+
+    configure_logging(config_from_env())
+    addresses = [f"{args.host}:{args.port}"]
+    if args.uds:
+        addresses.append(f"unix:{args.uds}")
+    asyncio.run(serve(addresses, args.graceful_timeout))
+
+if __name__ == "__main__":
+    main()
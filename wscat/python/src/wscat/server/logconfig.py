@@ -0,0 +1,119 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_DATEFMT = "%Y-%m-%d %H:%M:%S"
+
+ROUTE_LOGGER_PREFIX = "wscat.route"
+
+class LogConfig:
+    """Log level plus per-route sampling rates (0.0 drops all, 1.0 keeps all)."""
+
+    def __init__(self, level=logging.INFO, sample_rates=None):
+        self.level = level
+        self.sample_rates = dict(sample_rates or {})
+
+PROFILES = {
+    # Every request line, like the original synchronous setup.
+    "dev": LogConfig(logging.INFO),
+    # Keep a small sample of per-request lines, every /math session summary.
+    "prod": LogConfig(logging.INFO, {"add": 0.001, "add_batch": 0.01, "math": 1.0}),
+    # Errors and warnings only.
+    "quiet": LogConfig(logging.WARNING),
+}
+
+class SampledLogger(logging.LoggerAdapter):
+    """Logger that lets through roughly `rate` of its calls below WARNING.
+
+    The coin is tossed in isEnabledFor(), which Logger.info() and friends
+    call first, so a dropped call never builds a LogRecord or walks the
+    stack for its caller. Warnings and errors always pass.
+    """
+
+    def __init__(self, logger, rate=1.0):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def isEnabledFor(self, level):
+        if level < logging.WARNING and self.rate < 1.0 and random.random() >= self.rate:
+            return False
+        return self.logger.isEnabledFor(level)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock prepare() formats the record before enqueueing it so it can be
+    pickled; our queue never leaves the process, so the record goes as is.
+    """
+
+    def prepare(self, record):
+        return record
+
+_route_loggers = {}
+
+def route_logger(route):
+    """Sampled logger for per-request records of one route, e.g. route_logger("add")."""
+    if route not in _route_loggers:
+        _route_loggers[route] = SampledLogger(logging.getLogger(f"{ROUTE_LOGGER_PREFIX}.{route}"))
+    return _route_loggers[route]
+
+def parse_sample_rates(spec):
+    """Parse "add=0.01,math=1" into {"add": 0.01, "math": 1.0}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, rate = item.partition("=")
+        rates[route.strip()] = float(rate)
+    return rates
+
+def config_from_env(environ=os.environ):
+    """Build the LogConfig selected at startup.
+
+    WSCAT_LOG_PROFILE picks one of PROFILES (default "dev"); WSCAT_LOG_LEVEL
+    and WSCAT_LOG_SAMPLE ("route=rate,...") override parts of it.
+    """
+    profile = environ.get("WSCAT_LOG_PROFILE", "dev")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown WSCAT_LOG_PROFILE {profile!r}, expected one of {sorted(PROFILES)}")
+    base = PROFILES[profile]
+    config = LogConfig(base.level, base.sample_rates)
+    if "WSCAT_LOG_LEVEL" in environ:
+        levels = logging.getLevelNamesMapping()
+        level = environ["WSCAT_LOG_LEVEL"].upper()
+        if level not in levels:
+            raise ValueError(f"Unknown WSCAT_LOG_LEVEL {environ['WSCAT_LOG_LEVEL']!r}, "
+                             f"expected one of {sorted(levels, key=levels.get)}")
+        config.level = levels[level]
+    if "WSCAT_LOG_SAMPLE" in environ:
+        config.sample_rates.update(parse_sample_rates(environ["WSCAT_LOG_SAMPLE"]))
+    return config
+
+def configure_logging(config):
+    """Route all records through a queue drained by a background thread.
+
+    The event loop only enqueues records; formatting and the write to
+    stderr happen on the QueueListener thread. Handlers configured on the
+    root logger before are replaced.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATEFMT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+
+    logging.basicConfig(
+        level=config.level,
+        handlers=[DeferredQueueHandler(log_queue)],
+        force=True,
+    )
+
+    for logger in _route_loggers.values():
+        logger.rate = 1.0
+    for route, rate in config.sample_rates.items():
+        route_logger(route).rate = rate
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
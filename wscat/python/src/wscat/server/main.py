@@ -1,83 +1,324 @@
+import asyncio
 import logging
-import random
-from fastapi import FastAPI, Request, Response, WebSocket
-from . import simple_math_pb2
+import numpy as np
+from time import monotonic, perf_counter
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
+from google.protobuf.message import DecodeError
+from wscat.codec import codec_from_env
+from . import metrics, simple_math_pb2
+from .logconfig import config_from_env, configure_logging, route_logger
+from .capture import CaptureMiddleware, capture_from_env
+from .delimited import encode_delimited, iter_delimited
+from .fastpath import AddFastPath
+from .math_cache import MathCache
+from .reaper import MathReaper, idle_timeout_from_env
+from .sessions import SessionTable
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+configure_logging(config_from_env())
 
 logger = logging.getLogger(__name__)
+add_logger = route_logger("add")
+add_batch_logger = route_logger("add_batch")
+math_logger = route_logger("math")
 
 app = FastAPI()
 
+# Wire format codec for the scalar messages, chosen with WSCAT_CODEC.
+codec = codec_from_env()
+
+add_metrics = metrics.RouteMetrics("/add")
+add_batch_metrics = metrics.RouteMetrics("/add/batch")
+math_received = metrics.bytes_received("/math")
+math_sent = metrics.bytes_sent("/math")
+add_request_parse = metrics.parse_latency("AddRequest")
+add_response_serialize = metrics.serialize_latency("AddResponse")
+add_batch_request_parse = metrics.parse_latency("AddBatchRequest")
+add_batch_response_serialize = metrics.serialize_latency("AddBatchResponse")
+math_solution_parse = metrics.parse_latency("MathSolution")
+stream_received = metrics.bytes_received("/add/stream")
+stream_sent = metrics.bytes_sent("/add/stream")
+
 @app.post("/add", response_class=Response)
 async def add_numbers(request: Request) -> Response:
+    started = perf_counter()
     body = await request.body()
 
-    add_request = simple_math_pb2.AddRequest()
-    add_request.ParseFromString(body)
+    try:
+        parse_started = perf_counter()
+        a, b = codec.decode_add_request(body)
+        add_request_parse.observe(perf_counter() - parse_started)
+    except DecodeError:
+        return Response(status_code=400)
 
-    result = add_request.a + add_request.b
-    logger.info(f"Received request: a={add_request.a}, b={add_request.b}. Result: {result}")
+    result = a + b
+    add_logger.info("Received request: a=%d, b=%d. Result: %d", a, b, result)
 
-    # 3. Create the response object and serialize it to binary Protobuf
-    add_response = simple_math_pb2.AddResponse(result=result)
-    
+    # 3. Serialize the response to binary Protobuf
+    serialize_started = perf_counter()
+    content = codec.encode_add_response(result)
+    add_response_serialize.observe(perf_counter() - serialize_started)
+
+    add_metrics.received.inc(len(body))
+    add_metrics.sent.inc(len(content))
+    add_metrics.latency.observe(perf_counter() - started)
     return Response(
-        content=add_response.SerializeToString(),
+        content=content,
         media_type="application/protobuf"
     )
 
-def generate_math_problem():
-    """Generate a random math problem with two integers below 20."""
-    a = random.randint(1, 19)
-    b = random.randint(1, 19)
-    return simple_math_pb2.MathProblem(a=a, b=b)
+INT32_MIN = int(np.iinfo(np.int32).min)
+INT32_MAX = int(np.iinfo(np.int32).max)
+
+def add_batch(a, b):
+    """Add two equally long int32 sequences in one vectorized pass.
+
+    Returns the wrapped int32 sums and a per-element overflow mask.
+    """
+    sums = np.asarray(a, dtype=np.int64) + np.asarray(b, dtype=np.int64)
+    overflow = (sums < INT32_MIN) | (sums > INT32_MAX)
+    return sums.astype(np.int32), overflow
+
+@app.post("/add/batch", response_class=Response)
+async def add_numbers_batch(request: Request) -> Response:
+    started = perf_counter()
+    body = await request.body()
+    add_batch_metrics.received.inc(len(body))
+
+    batch_request = simple_math_pb2.AddBatchRequest()
+    try:
+        parse_started = perf_counter()
+        batch_request.ParseFromString(body)
+        add_batch_request_parse.observe(perf_counter() - parse_started)
+    except DecodeError:
+        return Response(status_code=400)
+
+    if len(batch_request.a) != len(batch_request.b):
+        return Response(status_code=400)
+
+    results, overflow = add_batch(batch_request.a, batch_request.b)
+    add_batch_logger.info("Received batch of %d additions, %d overflowed", len(results), overflow.sum())
+
+    batch_response = simple_math_pb2.AddBatchResponse(
+        result=results.tolist(),
+        overflow=overflow.tolist(),
+    )
+    serialize_started = perf_counter()
+    content = batch_response.SerializeToString()
+    add_batch_response_serialize.observe(perf_counter() - serialize_started)
+
+    add_batch_metrics.sent.inc(len(content))
+    add_batch_metrics.latency.observe(perf_counter() - started)
+    return Response(
+        content=content,
+        media_type="application/protobuf"
+    )
+
+math_cache = MathCache()
+math_sessions = SessionTable()
+# Closes sessions that stay silent past WSCAT_MATH_IDLE_TIMEOUT or stop
+# answering pings.
+math_reaper = MathReaper(math_sessions, idle_timeout_from_env())
+
+# Upper bound for /math?pipeline=K, the number of problems in flight at once.
+MAX_PIPELINE = 64
+
+async def send_frame(websocket, frame):
+    await websocket.send_bytes(frame)
+    math_sent.inc(len(frame))
+
+async def receive_solution(websocket, slot):
+    data = await websocket.receive_bytes()
+    math_sessions.seen[slot] = monotonic()
+    math_received.inc(len(data))
+    parse_started = perf_counter()
+    solution = codec.decode_math_solution(data)
+    math_solution_parse.observe(perf_counter() - parse_started)
+    return solution  # (answer, id)
+
+async def play_lockstep(websocket, slot):
+    """One problem at a time until it is solved; returns True when solved."""
+    # Send initial math problem
+    problem = math_sessions.problem[slot]
+    math_logger.debug("Sending problem: %d + %d", *math_cache.operands[problem])
+    await send_frame(websocket, math_cache.problems[problem])
+    
+    while True:
+        # Wait for solution
+        answer, _ = await receive_solution(websocket, slot)
+        math_sessions.turns[slot] += 1
+        
+        expected = math_cache.answers[math_sessions.problem[slot]]
+        math_logger.debug("Received answer: %d, expected: %d", answer, expected)
+        
+        if answer == expected:
+            # Correct answer - send congratulations
+            await send_frame(websocket, math_cache.congratulations)
+            return True
+        else:
+            # Wrong answer - send new problem
+            problem = math_cache.random_index()
+            math_sessions.problem[slot] = problem
+            await send_frame(websocket, math_cache.new_problems[problem])
+            math_logger.debug("Wrong answer. Sending new problem: %d + %d", *math_cache.operands[problem])
+
+async def play_pipelined(websocket, slot, depth):
+    """`depth` games at once, answered in any order; returns True when all are solved.
+
+    Every problem carries a fresh id. A solution names the problem it answers,
+    and the response carries that id back, so the client can match them up.
+    """
+    outstanding = {}  # problem id -> index into math_cache
+    next_id = 1
+    for _ in range(depth):
+        problem = math_cache.random_index()
+        outstanding[next_id] = problem
+        await send_frame(websocket, math_cache.problem_frame(problem, next_id))
+        next_id += 1
+
+    while outstanding:
+        answer, id = await receive_solution(websocket, slot)
+        problem = outstanding.pop(id, None)
+        if problem is None:
+            math_logger.debug("Solution for unknown problem id %d", id)
+            await websocket.close(code=1008)
+            return False
+        math_sessions.turns[slot] += 1
+
+        if answer == math_cache.answers[problem]:
+            await send_frame(websocket, math_cache.congratulations_frame(id))
+        else:
+            problem = math_cache.random_index()
+            math_sessions.problem[slot] = problem
+            outstanding[next_id] = problem
+            await send_frame(websocket, math_cache.new_problem_frame(problem, next_id, id))
+            next_id += 1
+    return True
 
 @app.websocket("/math")
 async def websocket_math_endpoint(websocket: WebSocket):
     #print('yyy', flush=True)
+    depth = websocket.query_params.get("pipeline")
+    if depth is not None:
+        if not depth.isdigit() or not 1 <= int(depth) <= MAX_PIPELINE:
+            await websocket.close(code=1008)
+            return
+        depth = int(depth)
+
     await websocket.accept()
-    logger.info("WebSocket connection established for math problems")
+    metrics.active_websockets.inc()
+    slot = math_sessions.open(math_cache.random_index())
+    math_reaper.watch(slot, websocket)
+    solved = False
     
     try:
-        # Send initial math problem
-        problem = generate_math_problem()
-        logger.info(f"Sending problem: {problem.a} + {problem.b}")
-        await websocket.send_bytes(problem.SerializeToString())
-        
+        if depth is None:
+            solved = await play_lockstep(websocket, slot)
+        else:
+            solved = await play_pipelined(websocket, slot, depth)
+    except WebSocketDisconnect:
+        pass  # client left mid-game; the session summary below records it
+    except Exception as e:
+        logger.error("WebSocket error: %s", e)
+    finally:
+        math_reaper.unwatch(slot)
+        turns = math_sessions.turns[slot]
+        duration = math_sessions.close(slot)
+        metrics.active_websockets.dec()
+        metrics.math_session_duration.observe(duration)
+        metrics.math_session_turns.observe(turns)
+        math_logger.info(
+            "WebSocket session closed: turns=%d solved=%s duration=%.3fs",
+            turns, solved, duration,
+        )
+
+# Response frames an /add/stream connection may have queued but not yet sent.
+# When the queue is full the handler stops reading, so a client that does
+# not read its responses is slowed down by TCP flow control.
+STREAM_MAX_IN_FLIGHT = 256
+
+def stream_add(payload):
+    """Serialized AddResponse for one serialized AddRequest.
+
+    Raises DecodeError for malformed input and ValueError on int32 overflow.
+    """
+    a, b = codec.decode_add_request(payload)
+    result = a + b
+    if not INT32_MIN <= result <= INT32_MAX:
+        raise ValueError(f"{a} + {b} overflows int32")
+    return codec.encode_add_response(result)
+
+async def stream_writer(websocket, outbox):
+    """Send queued frames in order until the None sentinel."""
+    try:
+        while (frame := await outbox.get()) is not None:
+            await websocket.send_bytes(frame)
+            stream_sent.inc(len(frame))
+    except Exception:
+        # The peer is gone. Keep draining so the reader cannot block on a
+        # full queue before its next receive notices the disconnect.
+        while await outbox.get() is not None:
+            pass
+
+@app.websocket("/add/stream")
+async def websocket_add_stream_endpoint(websocket: WebSocket):
+    """Additions over one long-lived WebSocket.
+
+    Each frame is one AddRequest and is answered by one AddResponse frame.
+    With ?delimited=1 each frame holds any number of length-delimited
+    AddRequests and is answered by one frame of length-delimited
+    AddResponses. Responses keep the order of the requests.
+    """
+    delimited = websocket.query_params.get("delimited") == "1"
+    await websocket.accept()
+    metrics.active_websockets.inc()
+    outbox = asyncio.Queue(maxsize=STREAM_MAX_IN_FLIGHT)
+    writer = asyncio.create_task(stream_writer(websocket, outbox))
+    additions = 0
+
+    try:
         while True:
-            # Wait for solution
             data = await websocket.receive_bytes()
-            solution = simple_math_pb2.MathSolution()
-            solution.ParseFromString(data)
-            
-            expected = problem.a + problem.b
-            logger.info(f"Received answer: {solution.answer}, expected: {expected}")
-            
-            if solution.answer == expected:
-                # Correct answer - send congratulations
-                response = simple_math_pb2.MathResponse()
-                response.congratulations = "Congratulations! Correct answer!"
-                await websocket.send_bytes(response.SerializeToString())
-                logger.info("Sent congratulations message")
-                break
+            stream_received.inc(len(data))
+            if delimited:
+                responses = [stream_add(payload) for payload in iter_delimited(data)]
+                additions += len(responses)
+                await outbox.put(encode_delimited(responses))
             else:
-                # Wrong answer - send new problem
-                problem = generate_math_problem()
-                response = simple_math_pb2.MathResponse()
-                response.new_problem.CopyFrom(problem)
-                await websocket.send_bytes(response.SerializeToString())
-                logger.info(f"Wrong answer. Sending new problem: {problem.a} + {problem.b}")
-    
+                await outbox.put(stream_add(data))
+                additions += 1
+    except WebSocketDisconnect:
+        writer.cancel()
+    except (DecodeError, ValueError) as e:
+        logger.warning("Closing /add/stream on invalid request: %s", e)
+        await outbox.put(None)
+        await writer
+        await websocket.close(code=1007)
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+        writer.cancel()
+        logger.error("WebSocket error: %s", e)
     finally:
-        logger.info("WebSocket connection closed")
+        metrics.active_websockets.dec()
+        add_logger.info("/add/stream session closed: additions=%d", additions)
+
+@app.get("/metrics", response_class=Response)
+def read_metrics() -> Response:
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/sessions")
+def read_sessions():
+    """Memory accounting for the /math session table, and reaped sessions."""
+    return {**math_sessions.memory_report(), **math_reaper.report()}
 
 @app.get("/")
 def read_root():
     return {"message": "Protobuf service is running. POST to /add to use. WebSocket math game at /math."}
+
+# Same app with POST /add answered by a raw ASGI handler in front of FastAPI;
+# serve "wscat.server.main:fast_app" (or wscat-serve --fast-add) to use it.
+fast_app = AddFastPath(app, codec)
+
+# WSCAT_CAPTURE=path records /add and /math traffic for wscat-replay.
+capture_log = capture_from_env()
+if capture_log is not None:
+    app = CaptureMiddleware(app, capture_log)
+    fast_app = CaptureMiddleware(fast_app, capture_log)
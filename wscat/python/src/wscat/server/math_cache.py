@@ -0,0 +1,54 @@
+import random
+from wscat.codec import encode_varint
+from . import simple_math_pb2
+
+OPERAND_MIN = 1
+OPERAND_MAX = 19
+CONGRATULATIONS = "Congratulations! Correct answer!"
+
+def _id_field(field_number, id):
+    """Encoded uint32 `id` field, or nothing for the proto3 default 0."""
+    return encode_varint(field_number << 3) + encode_varint(id) if id else b""
+
+class MathCache:
+    """Serialized frames for every problem the /math game can pose.
+
+    Problems are addressed by an index into flat lists, so a game turn is a
+    list lookup instead of building and serializing protobuf messages.
+    """
+
+    def __init__(self):
+        operands = range(OPERAND_MIN, OPERAND_MAX + 1)
+        self.operands = [(a, b) for a in operands for b in operands]
+        self.answers = [a + b for a, b in self.operands]
+        self.problems = []
+        self.new_problems = []
+        for a, b in self.operands:
+            problem = simple_math_pb2.MathProblem(a=a, b=b)
+            self.problems.append(problem.SerializeToString())
+            self.new_problems.append(
+                simple_math_pb2.MathResponse(new_problem=problem).SerializeToString()
+            )
+        self.congratulations = simple_math_pb2.MathResponse(
+            congratulations=CONGRATULATIONS
+        ).SerializeToString()
+
+    def random_index(self):
+        """Pick a random problem; a and b are uniform in OPERAND_MIN..OPERAND_MAX."""
+        return random.randrange(len(self.operands))
+
+    # Pipelined sessions need correlation ids in the frames. Protobuf fields
+    # may be concatenated, so the id is appended to the cached bytes in
+    # field-number order, which gives the same bytes protoc would.
+
+    def problem_frame(self, index, id):
+        """MathProblem for `index` with its id set."""
+        return self.problems[index] + _id_field(3, id)
+
+    def new_problem_frame(self, index, problem_id, id):
+        """MathResponse(new_problem=..., id=id), the new problem carrying `problem_id`."""
+        problem = self.problem_frame(index, problem_id)
+        return b"\x12" + encode_varint(len(problem)) + problem + _id_field(3, id)
+
+    def congratulations_frame(self, id):
+        return self.congratulations + _id_field(3, id)
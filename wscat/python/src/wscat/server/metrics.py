@@ -0,0 +1,149 @@
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers a sub-millisecond /add up to a slow client on /math.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+)
+CODEC_BUCKETS = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001,
+)
+SESSION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+TURN_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, labels):
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield name, self.labels, (), self.value
+
+class Gauge(Counter):
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions."""
+
+    def __init__(self, labels, buckets):
+        self.labels = labels
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self, name):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f"{name}_bucket", self.labels, (("le", _format_value(float(bound))),), cumulative
+        cumulative += self.counts[-1]
+        yield f"{name}_bucket", self.labels, (("le", "+Inf"),), cumulative
+        yield f"{name}_sum", self.labels, (), self.sum
+        yield f"{name}_count", self.labels, (), cumulative
+
+class Registry:
+    """Holds metric families and renders them in Prometheus text format.
+
+    Children are created once per label set and kept by the caller, so
+    the hot path never looks anything up.
+    """
+
+    def __init__(self):
+        self.families = {}
+
+    def _child(self, kind, name, help, labels, factory):
+        family = self.families.setdefault(name, (kind, help, {}))
+        if family[0] != kind:
+            raise ValueError(f"Metric {name} already registered as a {family[0]}")
+        key = tuple(sorted(labels.items()))
+        children = family[2]
+        if key not in children:
+            children[key] = factory(key)
+        return children[key]
+
+    def counter(self, name, help, **labels):
+        return self._child("counter", name, help, labels, Counter)
+
+    def gauge(self, name, help, **labels):
+        return self._child("gauge", name, help, labels, Gauge)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        return self._child("histogram", name, help, labels, lambda key: Histogram(key, buckets))
+
+    def render(self):
+        lines = []
+        for name, (kind, help, children) in self.families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for child in children.values():
+                for sample_name, labels, extra, value in child.samples(name):
+                    lines.append(f"{sample_name}{_format_labels(labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def request_latency(route):
+    return registry.histogram(
+        "wscat_request_duration_seconds", "Time spent handling an HTTP request.", route=route)
+
+def bytes_received(route):
+    return registry.counter(
+        "wscat_received_bytes_total", "Payload bytes received from clients.", route=route)
+
+def bytes_sent(route):
+    return registry.counter(
+        "wscat_sent_bytes_total", "Payload bytes sent to clients.", route=route)
+
+def parse_latency(message):
+    return registry.histogram(
+        "wscat_protobuf_parse_seconds", "Time spent in ParseFromString.",
+        buckets=CODEC_BUCKETS, message=message)
+
+def serialize_latency(message):
+    return registry.histogram(
+        "wscat_protobuf_serialize_seconds", "Time spent in SerializeToString.",
+        buckets=CODEC_BUCKETS, message=message)
+
+class RouteMetrics:
+    """Latency and traffic metrics for one HTTP route."""
+
+    def __init__(self, route):
+        self.latency = request_latency(route)
+        self.received = bytes_received(route)
+        self.sent = bytes_sent(route)
+
+math_session_duration = registry.histogram(
+    "wscat_math_session_duration_seconds", "Lifetime of a /math WebSocket session.",
+    buckets=SESSION_BUCKETS)
+math_session_turns = registry.histogram(
+    "wscat_math_session_turns", "Solutions received per /math WebSocket session.",
+    buckets=TURN_BUCKETS)
+
+def math_sessions_reaped(reason):
+    return registry.counter(
+        "wscat_math_sessions_reaped_total", "/math sessions closed by the server for inactivity.",
+        reason=reason)
+
+active_websockets = registry.gauge(
+    "wscat_websockets_active", "Currently open WebSocket connections.")
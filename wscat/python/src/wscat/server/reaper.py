@@ -0,0 +1,199 @@
+"""Idle timeouts and ping/pong heartbeats for /math sessions.
+
+Every watched session has at most one timer on a shared TimerWheel, so the
+cost of keeping 100k sessions in check is one wheel tick at a time rather
+than 100k timer handles on the event loop. The timer fires at the session's
+next deadline: its idle timeout, its next heartbeat ping, or the moment
+its ping goes unanswered. Handlers only record when a frame arrives, in
+SessionTable.seen; a session that keeps talking is never pinged.
+
+WSCAT_MATH_IDLE_TIMEOUT sets the seconds a client may stay silent (default
+300, 0 disables).
+"""
+import asyncio
+import logging
+import os
+import random
+import struct
+import time
+from . import metrics
+from .timer_wheel import TimerWheel
+
+DEFAULT_IDLE_TIMEOUT = 300.0
+# WebSocket close code for "going away".
+CLOSE_GOING_AWAY = 1001
+
+logger = logging.getLogger(__name__)
+
+def idle_timeout_from_env(environ=os.environ):
+    """Seconds from WSCAT_MATH_IDLE_TIMEOUT; None when it is 0."""
+    timeout = float(environ.get("WSCAT_MATH_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT))
+    return timeout or None
+
+class UvicornPinger:
+    """Heartbeats through uvicorn's websockets-sansio protocol.
+
+    ASGI has no message for pings. uvicorn keeps the payload of its keepalive
+    ping in flight in `pending_ping_payload` and clears it when the matching
+    pong arrives, so a ping sent the same way is answered when that field
+    goes back to None. Taking over stops uvicorn's own per-connection ping
+    timers; interval and timeout are the server's --ws-ping-interval and
+    --ws-ping-timeout.
+
+    All of this is uvicorn internals. attach() checks for every attribute
+    used here and, when one is missing (another uvicorn version or WS
+    backend), warns once and leaves heartbeats to uvicorn: the reaper then
+    only enforces the idle timeout.
+    """
+
+    # Internals of WebSocketsSansIOProtocol the pinger relies on
+    PROTOCOL_ATTRIBUTES = ("ping_interval", "ping_timeout", "stop_keepalive", "pending_ping_payload",
+                           "ping_sent_at", "keepalive_timeout", "close_sent", "transport", "loop", "conn")
+    CONNECTION_ATTRIBUTES = ("send_ping", "data_to_send")
+    warned = False
+
+    def __init__(self, protocol):
+        self.protocol = protocol
+        self.interval = protocol.ping_interval
+        self.timeout = protocol.ping_timeout or protocol.ping_interval
+        protocol.stop_keepalive()
+
+    @classmethod
+    def attach(cls, websocket):
+        """A pinger for a Starlette WebSocket, or None when heartbeats are unavailable."""
+        try:
+            from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+        except ImportError:
+            return None
+        # Under plain uvicorn receive() is a bound method of the protocol;
+        # behind middleware that wraps receive it is not, and there are no pings.
+        protocol = getattr(getattr(websocket, "_receive", None), "__self__", None)
+        if not isinstance(protocol, WebSocketsSansIOProtocol):
+            return None
+        missing = [name for name in cls.PROTOCOL_ATTRIBUTES if not hasattr(protocol, name)]
+        if not missing:
+            missing = [f"conn.{name}" for name in cls.CONNECTION_ATTRIBUTES if not hasattr(protocol.conn, name)]
+        if missing:
+            if not cls.warned:
+                cls.warned = True
+                logger.warning("uvicorn's websockets protocol lacks %s; /math sessions get idle timeouts only, "
+                               "heartbeats stay with uvicorn", ", ".join(missing))
+            return None
+        if not protocol.ping_interval:
+            return None
+        return cls(protocol)
+
+    def ping(self):
+        protocol = self.protocol
+        if protocol.close_sent or protocol.transport.is_closing():
+            return
+        protocol.pending_ping_payload = struct.pack("!I", random.getrandbits(32))
+        protocol.ping_sent_at = protocol.loop.time()
+        protocol.conn.send_ping(protocol.pending_ping_payload)
+        protocol.transport.write(b"".join(protocol.conn.data_to_send()))
+
+    def answered(self):
+        return self.protocol.pending_ping_payload is None
+
+    def fail(self):
+        """Drop the connection the way uvicorn does when a pong is late (1011)."""
+        self.protocol.keepalive_timeout()
+
+class Watch:
+    __slots__ = ("slot", "websocket", "pinger", "timer", "ping_sent", "answered")
+
+    def __init__(self, slot, websocket, pinger):
+        self.slot = slot
+        self.websocket = websocket
+        self.pinger = pinger
+        self.timer = None
+        self.ping_sent = 0.0  # when the unanswered ping went out, 0 if none
+        self.answered = 0.0  # when the last answered ping went out
+
+class MathReaper:
+    """Closes /math sessions whose client went quiet or stopped answering pings."""
+
+    def __init__(self, sessions, idle_timeout=DEFAULT_IDLE_TIMEOUT, wheel=None):
+        self.sessions = sessions
+        self.idle_timeout = idle_timeout
+        self.wheel = wheel or TimerWheel()
+        self.watches = {}  # slot -> Watch
+        self.closing = set()  # close() tasks of idle sessions
+        self.reaped = {
+            "idle": metrics.math_sessions_reaped("idle"),
+            "heartbeat": metrics.math_sessions_reaped("heartbeat"),
+        }
+
+    def watch(self, slot, websocket):
+        """Start watching the session in `slot`; call after accept()."""
+        pinger = UvicornPinger.attach(websocket)
+        if self.idle_timeout is None and pinger is None:
+            return
+        watch = Watch(slot, websocket, pinger)
+        self.watches[slot] = watch
+        self.wheel.start()
+        self._check(watch)
+
+    def unwatch(self, slot):
+        watch = self.watches.pop(slot, None)
+        if watch is not None and watch.timer is not None:
+            self.wheel.cancel(watch.timer)
+
+    def _check(self, watch):
+        watch.timer = None
+        now = time.monotonic()
+        seen = self.sessions.seen[watch.slot]
+        due = float("inf")
+
+        if self.idle_timeout is not None:
+            if now - seen >= self.idle_timeout:
+                return self._reap(watch, "idle")
+            due = seen + self.idle_timeout
+
+        pinger = watch.pinger
+        if pinger is not None:
+            # A pong proves the client is alive, not that it is playing:
+            # it postpones the next ping but not the idle timeout.
+            if watch.ping_sent and pinger.answered():
+                watch.answered, watch.ping_sent = watch.ping_sent, 0.0
+            if watch.ping_sent:
+                if now - watch.ping_sent >= pinger.timeout:
+                    return self._reap(watch, "heartbeat")
+                due = min(due, watch.ping_sent + pinger.timeout)
+            else:
+                alive = max(seen, watch.answered)
+                if now - alive >= pinger.interval:
+                    pinger.ping()
+                    watch.ping_sent = now
+                    due = min(due, now + pinger.timeout)
+                else:
+                    due = min(due, alive + pinger.interval)
+
+        watch.timer = self.wheel.schedule(due - now, self._check, watch)
+
+    def _reap(self, watch, reason):
+        del self.watches[watch.slot]
+        self.reaped[reason].inc()
+        logger.info("Closing /math session in slot %d: %s timeout", watch.slot, reason)
+        # Either way the handler's pending receive ends with WebSocketDisconnect.
+        if reason == "heartbeat":
+            # The peer is gone, a close handshake would only wait for it.
+            watch.pinger.fail()
+            return
+        task = asyncio.get_running_loop().create_task(self._close(watch.websocket))
+        self.closing.add(task)
+        task.add_done_callback(self.closing.discard)
+
+    @staticmethod
+    async def _close(websocket):
+        try:
+            await websocket.close(code=CLOSE_GOING_AWAY)
+        except Exception:
+            pass  # the client left or the handler closed it first
+
+    def report(self):
+        return {
+            "watched_sessions": len(self.watches),
+            "reaped_idle": self.reaped["idle"].value,
+            "reaped_heartbeat": self.reaped["heartbeat"].value,
+        }
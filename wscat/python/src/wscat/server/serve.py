@@ -0,0 +1,233 @@
+"""Production entry point: several uvicorn workers under a small supervisor.
+
+    uv run wscat-serve --workers 4 --loop uvloop --http httptools
+
+By default the supervisor binds the listening socket once and every worker
+accepts on an inherited copy of it (pre-fork). With --reuse-port each worker
+binds its own SO_REUSEPORT socket and the kernel balances connections.
+With --uds the app is also served on a Unix domain socket, which clients on
+the same host reach as unix:PATH; it is always bound once and shared.
+
+--http2 runs the workers on hypercorn instead of uvicorn, which speaks
+HTTP/2 over cleartext (h2c, by prior knowledge or Upgrade) next to HTTP/1.1
+and WebSockets on the same sockets. It needs the `http2` extra.
+
+On SIGINT/SIGTERM workers stop accepting, let in-flight /math sessions
+finish for up to --graceful-timeout seconds, then close what is left.
+Workers that exit on their own are restarted.
+
+/metrics and /sessions report on the worker that happens to accept the
+request: each process keeps its own counters, and nothing adds them up.
+With more than one worker a scrape sees a random worker's numbers, so
+counters appear to jump back and forth; scrape a single-worker server, or
+run one wscat-serve --workers 1 per port, when the numbers matter.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import stat
+import time
+import uvicorn
+from . import metrics
+from .logconfig import LOG_DATEFMT, LOG_FORMAT
+
+APP = "wscat.server.main:app"
+FAST_ADD_APP = "wscat.server.main:fast_app"
+
+# A worker that dies sooner than this after starting is restarted with a delay,
+# so a worker that cannot start does not turn into a busy fork loop.
+MIN_WORKER_UPTIME = 5.0
+RESTART_DELAY = 1.0
+
+logger = logging.getLogger("wscat.serve")
+
+def bind_socket(host, port, reuse_port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def bind_unix_socket(path):
+    """Listening AF_UNIX socket at `path`, replacing a stale socket file."""
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, 0o666)
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn.Server that waits for open WebSocket sessions before closing them."""
+
+    async def shutdown(self, sockets=None):
+        for server in self.servers:
+            server.close()
+
+        loop = asyncio.get_running_loop()
+        timeout = self.config.timeout_graceful_shutdown
+        deadline = loop.time() + (timeout or 0)
+        if metrics.active_websockets.value:
+            logger.info("Draining %d WebSocket session(s)", metrics.active_websockets.value)
+        while metrics.active_websockets.value and loop.time() < deadline and not self.force_exit:
+            await asyncio.sleep(0.1)
+
+        # uvicorn waits for the remaining tasks for the graceful timeout again;
+        # only give it what is left of ours, so the whole shutdown stays within it.
+        if timeout is not None:
+            self.config.timeout_graceful_shutdown = max(0.0, deadline - loop.time())
+        try:
+            await super().shutdown(sockets=sockets)
+        finally:
+            self.config.timeout_graceful_shutdown = timeout
+
+def ignore_cancelled(loop, context):
+    # Python 3.11's StreamReaderProtocol reports every connection task
+    # cancelled at shutdown as an unhandled exception.
+    if not isinstance(context.get("exception"), asyncio.CancelledError):
+        loop.default_exception_handler(context)
+
+def run_hypercorn(options, sockets):
+    """Serve on `sockets` with hypercorn until SIGINT/SIGTERM."""
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    from uvicorn.importer import import_from_string
+
+    config = Config()
+    config.bind = [f"fd://{sock.fileno()}" for sock in sockets]
+    config.graceful_timeout = options.graceful_timeout
+    config.accesslog = None
+    config.errorlog = logging.getLogger("hypercorn.error")  # handled like every other logger
+    app = import_from_string(FAST_ADD_APP if options.fast_add else APP)
+
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        loop.set_exception_handler(ignore_cancelled)
+        await serve(app, config, shutdown_trigger=stop.wait)
+
+    asyncio.run(main())
+
+def run_worker(options, sock, unix_sock):
+    """Worker process body; `sock` is None in --reuse-port mode, `unix_sock` without --uds."""
+    if sock is None:
+        sock = bind_socket(options.host, options.port, reuse_port=True)
+    sockets = [sock] if unix_sock is None else [sock, unix_sock]
+    if options.http2:
+        return run_hypercorn(options, sockets)
+    config = uvicorn.Config(
+        FAST_ADD_APP if options.fast_add else APP,
+        loop=options.loop,
+        http=options.http,
+        reload=False,
+        access_log=False,
+        timeout_graceful_shutdown=options.graceful_timeout,
+    )
+    DrainingServer(config).run(sockets=sockets)
+
+class Supervisor:
+    """Keeps `options.workers` worker processes running until told to stop."""
+
+    def __init__(self, options):
+        self.options = options
+        self.context = multiprocessing.get_context("spawn")
+        self.sock = None if options.reuse_port else bind_socket(options.host, options.port, False)
+        self.unix_sock = bind_unix_socket(options.uds) if options.uds else None
+        self.workers = {}  # slot -> (process, start time)
+        self.stopping = False
+
+    def spawn(self, slot):
+        process = self.context.Process(
+            target=run_worker, args=(self.options, self.sock, self.unix_sock), name=f"wscat-worker-{slot}")
+        process.start()
+        self.workers[slot] = (process, time.monotonic())
+        logger.info("Started worker %d (pid %d)", slot, process.pid)
+
+    def handle_signal(self, signum, frame):
+        if not self.stopping:
+            logger.info("Received %s, shutting down workers", signal.Signals(signum).name)
+        self.stopping = True
+
+    def stop(self):
+        for process, _ in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.options.graceful_timeout + 5
+        for process, _ in self.workers.values():
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker pid %d did not exit in time, killing it", process.pid)
+                process.kill()
+                process.join()
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        for slot in range(self.options.workers):
+            self.spawn(slot)
+        logger.info("Serving on http://%s:%d with %d worker(s)",
+                    self.options.host, self.options.port, self.options.workers)
+        if self.options.uds:
+            logger.info("Also serving on unix:%s", self.options.uds)
+
+        while not self.stopping:
+            sentinels = [process.sentinel for process, _ in self.workers.values()]
+            multiprocessing.connection.wait(sentinels, timeout=0.5)
+            for slot, (process, started) in list(self.workers.items()):
+                if process.is_alive() or self.stopping:
+                    continue
+                logger.warning("Worker %d (pid %d) exited with code %s, restarting",
+                               slot, process.pid, process.exitcode)
+                if time.monotonic() - started < MIN_WORKER_UPTIME:
+                    time.sleep(RESTART_DELAY)
+                self.spawn(slot)
+
+        self.stop()
+        if self.unix_sock is not None:
+            self.unix_sock.close()
+            os.unlink(self.options.uds)
+        logger.info("All workers stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the wscat server with several workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; with more than one, /metrics and /sessions only cover the worker that answers")
+    parser.add_argument("--uds", metavar="PATH",
+                        help="also serve on a Unix domain socket at PATH")
+    parser.add_argument("--reuse-port", action="store_true",
+                        help="let every worker bind its own SO_REUSEPORT socket instead of sharing one")
+    parser.add_argument("--loop", choices=["auto", "asyncio", "uvloop"], default="auto",
+                        help="event loop; auto picks uvloop when installed")
+    parser.add_argument("--http", choices=["auto", "h11", "httptools"], default="auto",
+                        help="HTTP parser; auto picks httptools when installed")
+    parser.add_argument("--http2", action="store_true",
+                        help="serve h2c as well as HTTP/1.1 with hypercorn (--loop/--http are ignored)")
+    parser.add_argument("--fast-add", action="store_true",
+                        help="answer POST /add with the raw ASGI handler in front of FastAPI")
+    parser.add_argument("--graceful-timeout", type=float, default=30.0,
+                        help="seconds to let in-flight /math sessions finish on shutdown")
+    options = parser.parse_args()
+    capture = os.environ.get("WSCAT_CAPTURE")
+    if capture and options.workers > 1 and "{pid}" not in capture:
+        parser.error("WSCAT_CAPTURE needs a {pid} in the path with more than one worker, "
+                     "e.g. WSCAT_CAPTURE=traffic-{pid}.wcap")
+
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, datefmt=LOG_DATEFMT)
+    Supervisor(options).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import sys
+import time
+from array import array
+
+class SessionTable:
+    """State of all /math sessions in a few parallel typed arrays.
+
+    A session is a slot number; its current problem (an index into MathCache),
+    turn count, start time and the time of its last received frame live at
+    that position in the arrays, so the table costs a fixed number of bytes
+    per slot instead of a protobuf message and a handful of boxed ints per
+    coroutine. Freed slots are reused.
+    """
+
+    def __init__(self, capacity=1024):
+        self.problem = array('H', bytes(2 * capacity))
+        self.turns = array('I', bytes(4 * capacity))
+        self.started = array('d', bytes(8 * capacity))
+        self.seen = array('d', bytes(8 * capacity))
+        self.free = array('I', range(capacity - 1, -1, -1))  # stack of unused slots
+        self.active = 0
+        self.opened = 0
+
+    @property
+    def capacity(self):
+        return len(self.problem)
+
+    def _grow(self):
+        old = self.capacity
+        for column in (self.problem, self.turns, self.started, self.seen):
+            column.frombytes(bytes(column.itemsize * old))
+        self.free.extend(range(2 * old - 1, old - 1, -1))
+
+    def open(self, problem):
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        self.problem[slot] = problem
+        self.turns[slot] = 0
+        self.started[slot] = self.seen[slot] = time.monotonic()
+        self.active += 1
+        self.opened += 1
+        return slot
+
+    def close(self, slot):
+        """Free `slot`; returns the session's duration in seconds."""
+        self.free.append(slot)
+        self.active -= 1
+        return time.monotonic() - self.started[slot]
+
+    def bytes_per_slot(self):
+        return (
+            self.problem.itemsize + self.turns.itemsize
+            + self.started.itemsize + self.seen.itemsize + self.free.itemsize
+        )
+
+    def memory_report(self):
+        """Bytes held by the table itself, in total and per open session."""
+        table_bytes = (
+            sys.getsizeof(self.problem) + sys.getsizeof(self.turns)
+            + sys.getsizeof(self.started) + sys.getsizeof(self.seen) + sys.getsizeof(self.free)
+        )
+        return {
+            "active_sessions": self.active,
+            "opened_sessions": self.opened,
+            "capacity": self.capacity,
+            "bytes_per_slot": self.bytes_per_slot(),
+            "table_bytes": table_bytes,
+            "table_bytes_per_active_session": table_bytes / self.active if self.active else None,
+        }
@@ -0,0 +1,80 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+class TimerWheel:
+    """Hashed timing wheel: many coarse timers driven by one asyncio task.
+
+    Time is cut into ticks of `tick` seconds. A timer due at tick T lives in
+    slot T % slots, so scheduling and cancelling are a dict insert/delete, and
+    each tick only looks at the timers of one slot. Timers more than one lap
+    away stay in their slot until their lap comes round. Callbacks run on the
+    event loop, up to one tick late, and must not block; one that raises is
+    logged and does not stop the others.
+    """
+
+    def __init__(self, tick=0.5, slots=1024, clock=time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self.slots = [{} for _ in range(slots)]  # handle -> (due tick, callback, argument)
+        self.where = {}  # handle -> slot index, for cancel()
+        self.origin = clock()
+        self.current = 0  # last tick processed
+        self.handles = itertools.count(1)
+        self.task = None
+
+    def __len__(self):
+        return len(self.where)
+
+    def schedule(self, delay, callback, argument):
+        """Call `callback(argument)` after about `delay` seconds; returns a handle."""
+        # From the clock, not the last tick processed, which lags after a quiet spell
+        due = max(self.current, self._tick_at(self.clock())) + max(1, math.ceil(delay / self.tick))
+        handle = next(self.handles)
+        index = due % len(self.slots)
+        self.slots[index][handle] = (due, callback, argument)
+        self.where[handle] = index
+        return handle
+
+    def cancel(self, handle):
+        index = self.where.pop(handle, None)
+        if index is not None:
+            del self.slots[index][handle]
+
+    def _tick_at(self, now):
+        return int((now - self.origin) / self.tick)
+
+    def advance(self, now=None):
+        """Run every timer due by `now`; returns how many fired."""
+        target = self._tick_at(self.clock() if now is None else now)
+        if not self.where:
+            # Nothing to fire on the way: skip the empty ticks
+            self.current = max(self.current, target)
+        fired = 0
+        while self.current < target:
+            self.current += 1
+            slot = self.slots[self.current % len(self.slots)]
+            due_now = [handle for handle, (due, _, _) in slot.items() if due <= self.current]
+            for handle in due_now:
+                _, callback, argument = slot.pop(handle)
+                del self.where[handle]
+                try:
+                    callback(argument)
+                except Exception:
+                    logger.exception("Timer callback %r failed", callback)
+                fired += 1
+        return fired
+
+    def start(self):
+        """Start the ticking task on the running loop, unless it already runs."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
@@ -0,0 +1,98 @@
+"""Benchmark: POST /add through FastAPI vs. the raw ASGI fast path.
+
+Drives both ASGI apps in-process with synthetic receive/send callables, so
+the numbers isolate the per-request cost of the server-side stack (no
+sockets, no HTTP parsing). For an end-to-end number, run wscat-serve with
+and without --fast-add and point wscat-bench at both.
+
+It first checks that both apps answer a valid request, a malformed body
+and an int32 overflow with the same status, headers and body.
+
+    WSCAT_LOG_PROFILE=quiet uv run python tools/bench_add_fastpath.py
+"""
+import asyncio
+import time
+from wscat.server import simple_math_pb2
+from wscat.server.main import app, fast_app
+
+BODY = simple_math_pb2.AddRequest(a=100, b=50).SerializeToString()
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "POST",
+    "scheme": "http",
+    "path": "/add",
+    "raw_path": b"/add",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [
+        (b"host", b"127.0.0.1:8000"),
+        (b"content-type", b"application/protobuf"),
+        (b"content-length", str(len(BODY)).encode()),
+    ],
+    "client": ("127.0.0.1", 50000),
+    "server": ("127.0.0.1", 8000),
+}
+
+async def request(asgi_app, body=BODY):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(dict(SCOPE), receive, send)
+    return sent
+
+async def response(asgi_app, body):
+    """(status, headers, body) sent for `body`; an exception raised after
+    the response, as for a server error, is left to the server to log."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    try:
+        await asgi_app(dict(SCOPE), receive, send)
+    except ValueError:
+        pass
+    start, *bodies = sent
+    return start["status"], start["headers"], b"".join(message.get("body", b"") for message in bodies)
+
+# Valid, malformed, and a sum past INT32_MAX
+PARITY_BODIES = [
+    BODY,
+    b"\x08",
+    simple_math_pb2.AddRequest(a=2**31 - 1, b=1).SerializeToString(),
+]
+
+async def measure(asgi_app, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            await request(asgi_app)
+        count += 100
+    return count / (time.perf_counter() - started)
+
+async def main():
+    for body in PARITY_BODIES:
+        expected, actual = await response(app, body), await response(fast_app, body)
+        assert expected == actual, f"{body!r}: FastAPI {expected} != fast path {actual}"
+
+    await measure(app, 0.5)  # warm up
+    fastapi_rps = await measure(app, 3)
+    fast_rps = await measure(fast_app, 3)
+    print(f"FastAPI route:   {fastapi_rps:10.0f} req/s")
+    print(f"ASGI fast path:  {fast_rps:10.0f} req/s")
+    print(f"speedup:         {fast_rps / fastapi_rps:10.2f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
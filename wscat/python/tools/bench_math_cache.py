@@ -0,0 +1,58 @@
+"""Micro-benchmark: per-turn cost of the /math game with and without MathCache.
+
+A "turn" is what the server does between two socket operations: parse the
+client's MathSolution, check it, and produce the next frame to send.
+
+    uv run python tools/bench_math_cache.py
+"""
+import random
+import timeit
+from wscat.server import simple_math_pb2
+from wscat.server.math_cache import MathCache
+
+def generate_math_problem():
+    a = random.randint(1, 19)
+    b = random.randint(1, 19)
+    return simple_math_pb2.MathProblem(a=a, b=b)
+
+def turn_uncached(problem, data):
+    solution = simple_math_pb2.MathSolution()
+    solution.ParseFromString(data)
+    if solution.answer == problem.a + problem.b:
+        response = simple_math_pb2.MathResponse()
+        response.congratulations = "Congratulations! Correct answer!"
+        return problem, response.SerializeToString()
+    problem = generate_math_problem()
+    response = simple_math_pb2.MathResponse()
+    response.new_problem.CopyFrom(problem)
+    return problem, response.SerializeToString()
+
+def turn_cached(cache, index, data):
+    solution = simple_math_pb2.MathSolution()
+    solution.ParseFromString(data)
+    if solution.answer == cache.answers[index]:
+        return index, cache.congratulations
+    index = cache.random_index()
+    return index, cache.new_problems[index]
+
+def main():
+    number = 200_000
+    wrong = simple_math_pb2.MathSolution(answer=-1).SerializeToString()
+
+    problem = generate_math_problem()
+    uncached = min(timeit.repeat(
+        lambda: turn_uncached(problem, wrong), number=number, repeat=5))
+
+    build = timeit.timeit(MathCache, number=1)
+    cache = MathCache()
+    index = cache.random_index()
+    cached = min(timeit.repeat(
+        lambda: turn_cached(cache, index, wrong), number=number, repeat=5))
+
+    print(f"cache build:  {build * 1e3:8.2f} ms (once, at startup)")
+    print(f"uncached:     {uncached / number * 1e9:8.0f} ns/turn")
+    print(f"cached:       {cached / number * 1e9:8.0f} ns/turn")
+    print(f"speedup:      {uncached / cached:8.2f}x")
+
+if __name__ == "__main__":
+    main()
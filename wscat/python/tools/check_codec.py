@@ -0,0 +1,152 @@
+"""Randomized parity check of wscat.codec.FastCodec against simple_math_pb2.
+
+For random field values (edge cases included) every encoder must produce
+the exact bytes of ProtobufCodec, and every decoder must agree with it on
+protoc output, on frames padded with unknown fields or repeated fields, and
+on truncated or corrupt input (both raise DecodeError, or both succeed with
+equal results). Also prints the per-call cost of both codecs, for small
+field values and for the values wscat-bench sends.
+
+    uv run python tools/check_codec.py --cases 20000
+"""
+import argparse
+import itertools
+import random
+import sys
+import timeit
+from google.protobuf.message import DecodeError
+from wscat.codec import FastCodec, ProtobufCodec, encode_varint
+
+INT32_EDGES = [0, 1, -1, 127, 128, -128, 2**14 - 1, 2**14, 2**31 - 1, -2**31, 300, -300]
+UINT32_EDGES = [0, 1, 127, 128, 2**14 - 1, 2**14, 2**32 - 1]
+
+def int32():
+    roll = random.random()
+    if roll < 0.3:
+        return random.choice(INT32_EDGES)
+    if roll < 0.6:  # the one- and two-byte values FastCodec special-cases
+        return random.randint(-10, 2**14)
+    return random.randint(-2**31, 2**31 - 1)
+
+def uint32():
+    roll = random.random()
+    if roll < 0.3:
+        return random.choice(UINT32_EDGES)
+    if roll < 0.6:
+        return random.randint(0, 2**14)
+    return random.randint(0, 2**32 - 1)
+
+def text():
+    alphabet = "abc XYZ!é€😀"
+    return "".join(random.choice(alphabet) for _ in range(random.randint(0, 12)))
+
+def unknown_field():
+    """A field with a number the schema does not use, of a random wire type."""
+    number = random.randint(4, 2000)
+    wire_type = random.choice([0, 1, 2, 5])
+    tag = encode_varint(number << 3 | wire_type)
+    if wire_type == 0:
+        return tag + encode_varint(random.randint(0, 2**64 - 1))
+    if wire_type == 1:
+        return tag + random.randbytes(8)
+    if wire_type == 5:
+        return tag + random.randbytes(4)
+    payload = random.randbytes(random.randint(0, 5))
+    return tag + encode_varint(len(payload)) + payload
+
+# (encoder name, decoder name, random argument tuple)
+MESSAGES = [
+    ("encode_add_request", "decode_add_request", lambda: (int32(), int32())),
+    ("encode_add_response", "decode_add_response", lambda: (int32(),)),
+    ("encode_math_problem", "decode_math_problem", lambda: (int32(), int32(), uint32())),
+    ("encode_math_solution", "decode_math_solution", lambda: (int32(), uint32())),
+    ("encode_congratulations", "decode_math_response", lambda: (text(), uint32())),
+    ("encode_new_problem", "decode_math_response", lambda: (int32(), int32(), uint32(), uint32())),
+]
+
+def decode_both(decoder, data):
+    outcomes = []
+    for codec in (ProtobufCodec, FastCodec):
+        try:
+            outcomes.append(getattr(codec, decoder)(data))
+        except DecodeError:
+            outcomes.append(DecodeError)
+    return outcomes
+
+def mutations(data):
+    """Variants of a valid frame that protoc-generated code must also handle."""
+    yield data
+    yield memoryview(data)
+    yield unknown_field() + data + unknown_field()
+    other = random.choice(MESSAGES)
+    yield data + getattr(ProtobufCodec, other[0])(*other[2]())  # later fields win / merge
+    if data:
+        yield data[:random.randrange(len(data))]  # truncated
+        corrupt = bytearray(data)
+        corrupt[random.randrange(len(corrupt))] = random.randrange(256)
+        yield bytes(corrupt)
+
+def check(cases):
+    failures = 0
+    for _ in range(cases):
+        encoder, decoder, arguments = random.choice(MESSAGES)
+        args = arguments()
+        expected = getattr(ProtobufCodec, encoder)(*args)
+        actual = getattr(FastCodec, encoder)(*args)
+        if expected != actual:
+            failures += 1
+            print(f"{encoder}{args}: protobuf {expected!r} != fast {actual!r}")
+        for data in mutations(expected):
+            pb_result, fast_result = decode_both(decoder, data)
+            if pb_result != fast_result:
+                failures += 1
+                print(f"{decoder}({bytes(data)!r}): protobuf {pb_result!r} != fast {fast_result!r}")
+    for value in (2**31, -2**31 - 1):
+        for codec in (ProtobufCodec, FastCodec):
+            try:
+                codec.encode_add_response(value)
+            except ValueError:
+                continue
+            failures += 1
+            print(f"{codec.name}: encode_add_response({value}) did not raise ValueError")
+    return failures
+
+def benchmark(repeat=7, number=20_000):
+    """Best-of-`repeat` cost per call. The codecs take turns, so changes in
+    machine load between repeats hit both alike."""
+    request = ProtobufCodec.encode_add_request(100, 50)
+    solution = ProtobufCodec.encode_math_solution(12, 7)
+    # What wscat-bench sends: a and b uniform in -1000..1000, so half are negative
+    pairs = [(random.randint(-1000, 1000), random.randint(-1000, 1000)) for _ in range(1024)]
+    mixed_requests = itertools.cycle([ProtobufCodec.encode_add_request(a, b) for a, b in pairs])
+    mixed_results = itertools.cycle([a + b for a, b in pairs])
+    for label, call in [
+        ("decode_add_request", lambda codec: codec.decode_add_request(request)),
+        ("  wscat-bench values", lambda codec: codec.decode_add_request(next(mixed_requests))),
+        ("encode_add_response", lambda codec: codec.encode_add_response(150)),
+        ("  wscat-bench values", lambda codec: codec.encode_add_response(next(mixed_results))),
+        ("decode_math_solution", lambda codec: codec.decode_math_solution(solution)),
+    ]:
+        times = {codec.name: float("inf") for codec in (ProtobufCodec, FastCodec)}
+        for _ in range(repeat):
+            for codec in (ProtobufCodec, FastCodec):
+                seconds = timeit.timeit(lambda: call(codec), number=number)
+                times[codec.name] = min(times[codec.name], seconds / number * 1e6)
+        print(f"{label:<22}" + "".join(f"{name:>10}: {us:6.2f} us" for name, us in times.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", type=int, default=20_000)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    failures = check(args.cases)
+    if failures:
+        sys.exit(f"FAIL: {failures} mismatch(es)")
+    print(f"OK: {args.cases} random cases agree")
+    benchmark()
+
+if __name__ == "__main__":
+    main()
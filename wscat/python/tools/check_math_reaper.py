@@ -0,0 +1,212 @@
+"""Check that idle and unresponsive /math sessions get reaped, and busy ones do not.
+
+Idle timeouts: opens --sessions sessions in-process through ASGI, half of
+them silent and half answering (wrongly) every --idle-timeout / 2 seconds.
+Every silent session must be closed with 1001 no sooner than the idle
+timeout and no later than two wheel ticks plus --slack after it, and no
+busy one may be closed.
+
+Heartbeats: serves the app with uvicorn on a loopback port and opens two
+connections, one with the websockets client (which answers pings) and one
+raw socket that completes the handshake and then never answers. Only the
+raw one may be dropped, within --ping-interval plus --ping-timeout.
+
+Exits non-zero on any failure.
+
+    WSCAT_LOG_PROFILE=quiet uv run python tools/check_math_reaper.py --sessions 100000 --idle-timeout 30 --slack 5
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import sys
+import time
+import uvicorn
+import websockets
+from wscat.codec import ProtobufCodec
+from wscat.server.main import app, math_reaper, math_sessions
+
+SCOPE = {
+    "type": "websocket",
+    "asgi": {"version": "3.0"},
+    "scheme": "ws",
+    "path": "/math",
+    "raw_path": b"/math",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"host", b"127.0.0.1:8000")],
+    "client": ("127.0.0.1", 50000),
+    "server": ("127.0.0.1", 8000),
+    "subprotocols": [],
+}
+CONNECT = {"type": "websocket.connect"}
+DISCONNECT = {"type": "websocket.disconnect", "code": 1000}
+# Operands are at least 1, so 0 is always a wrong answer and the game goes on.
+WRONG = {"type": "websocket.receive", "bytes": ProtobufCodec.encode_math_solution(0)}
+
+async def check_idle(sessions, idle_timeout, slack):
+    math_reaper.idle_timeout = idle_timeout
+    tick = math_reaper.wheel.tick
+    limit = idle_timeout + 2 * tick + slack
+    # Session number -> when the client connected. Taken before the server
+    # opens the session and stamps `seen`, so a measured lifetime is never
+    # shorter than the one the reaper goes by.
+    opened_at = {}
+    started = set()  # sessions whose first problem arrived
+    closed = {}  # session number -> (close code, seconds after opening)
+    opened = asyncio.Semaphore(0)
+    # One event per session: 100k waiters on a shared future would make
+    # every wake-up O(n) and the check itself quadratic.
+    hang_ups = []
+
+    def session(number, busy):
+        connected = False
+        hang_up = asyncio.Event()
+        hang_ups.append(hang_up)
+
+        async def receive():
+            nonlocal connected
+            if not connected:
+                connected = True
+                opened_at[number] = time.monotonic()
+                return CONNECT
+            if busy:
+                await asyncio.sleep(idle_timeout / 2)
+                if not hang_up.is_set():
+                    return WRONG
+            else:
+                await hang_up.wait()
+            return DISCONNECT
+
+        async def send(message):
+            if message["type"] == "websocket.send" and number not in started:
+                started.add(number)
+                opened.release()
+            elif message["type"] == "websocket.close":
+                closed[number] = (message.get("code"), time.monotonic() - opened_at[number])
+                hang_up.set()
+
+        return app(dict(SCOPE), receive, send)
+
+    reaped_before = math_reaper.reaped["idle"].value
+    tasks = [asyncio.ensure_future(session(number, number % 2)) for number in range(sessions)]
+    for _ in range(sessions):
+        await opened.acquire()
+    await asyncio.sleep(max(0, max(opened_at.values()) + limit - time.monotonic()))
+    watched = len(math_reaper.watches)
+    for hang_up in hang_ups:
+        hang_up.set()
+    await asyncio.gather(*tasks)
+
+    silent = range(0, sessions, 2)
+    delays = sorted(closed[n][1] for n in silent if n in closed)
+    report = {
+        "sessions": sessions,
+        "idle_timeout": idle_timeout,
+        "wheel_tick": tick,
+        "reaped_idle": math_reaper.reaped["idle"].value - reaped_before,
+        "watched_after_reaping": watched,
+        "close_after_seconds_p50": delays and round(delays[len(delays) // 2], 3),
+        "close_after_seconds_max": delays and round(delays[-1], 3),
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    missed = [n for n in silent if closed.get(n, (None,))[0] != 1001]
+    if missed:
+        failures.append(f"{len(missed)} silent session(s) not closed with 1001")
+    late = [n for n in silent if n in closed and closed[n][1] > limit]
+    if late:
+        failures.append(f"{len(late)} silent session(s) closed more than {limit:.1f}s after opening")
+    early = [n for n in silent if n in closed and closed[n][1] < idle_timeout]
+    if early:
+        failures.append(f"{len(early)} silent session(s) closed before the idle timeout")
+    busy_closed = [n for n in closed if n % 2]
+    if busy_closed:
+        failures.append(f"{len(busy_closed)} busy session(s) closed")
+    if report["reaped_idle"] != len(silent):
+        failures.append(f"reaped counter says {report['reaped_idle']}, expected {len(silent)}")
+    if math_sessions.active or math_reaper.watches or len(math_reaper.wheel):
+        failures.append("sessions, watches or timers left behind")
+    return failures
+
+async def raw_math_connection(port):
+    """Open /math over a bare socket and never answer anything after the handshake."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(
+        f"GET /math HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\n"
+        f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+    status = await reader.readline()
+    if b" 101 " not in status:
+        raise RuntimeError(f"handshake failed: {status!r}")
+    return reader, writer
+
+async def check_heartbeat(ping_interval, ping_timeout):
+    math_reaper.idle_timeout = None
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    config = uvicorn.Config(app, lifespan="off", log_level="warning",
+                            ws_ping_interval=ping_interval, ws_ping_timeout=ping_timeout)
+    server = uvicorn.Server(config)
+    serving = asyncio.ensure_future(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    reaped_before = math_reaper.reaped["heartbeat"].value
+    failures = []
+    async with websockets.connect(f"ws://127.0.0.1:{port}/math") as answering:
+        await answering.recv()
+        reader, writer = await raw_math_connection(port)
+        started = time.monotonic()
+        deadline = ping_interval + ping_timeout + 2 * math_reaper.wheel.tick + 1
+        # Drain until the server drops the connection; pings stay unanswered.
+        try:
+            while await asyncio.wait_for(reader.read(65536), deadline):
+                pass
+            dropped_after = time.monotonic() - started
+        except asyncio.TimeoutError:
+            dropped_after = None
+        writer.close()
+        if dropped_after is None:
+            failures.append(f"unresponsive connection still open after {deadline:.1f}s")
+        try:
+            await answering.ping()
+        except websockets.ConnectionClosed:
+            failures.append("connection answering pings was closed")
+
+    reaped = math_reaper.reaped["heartbeat"].value - reaped_before
+    print(json.dumps({
+        "ping_interval": ping_interval,
+        "ping_timeout": ping_timeout,
+        "reaped_heartbeat": reaped,
+        "dropped_after_seconds": dropped_after and round(dropped_after, 3),
+    }, indent=2))
+    if reaped != 1:
+        failures.append(f"heartbeat counter says {reaped}, expected 1")
+
+    server.should_exit = True
+    await serving
+    return failures
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--idle-timeout", type=float, default=2.0)
+    parser.add_argument("--slack", type=float, default=1.0,
+                        help="seconds a silent session may be closed late beyond two wheel ticks")
+    parser.add_argument("--ping-interval", type=float, default=1.0)
+    parser.add_argument("--ping-timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    failures = await check_idle(args.sessions, args.idle_timeout, args.slack)
+    failures += await check_heartbeat(args.ping_interval, args.ping_timeout)
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK: idle and unresponsive sessions reaped, busy ones left alone")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""Open many idle /math sessions in-process and check the memory per session.
+
+Each session is a real run of the app's /math handler, driven through ASGI
+with a receive() that never delivers a solution, so it sits in
+receive_bytes() the way an idle client does. tracemalloc measures what the
+sessions hold on the Python heap (handler coroutine, Starlette WebSocket,
+session table); server transport buffers are not included.
+
+Exits non-zero if the per-session cost goes over the budget.
+
+    WSCAT_LOG_PROFILE=quiet uv run python tools/check_session_memory.py --sessions 100000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import sys
+import tracemalloc
+from wscat.server.main import app, math_sessions
+
+SCOPE = {
+    "type": "websocket",
+    "asgi": {"version": "3.0"},
+    "scheme": "ws",
+    "path": "/math",
+    "raw_path": b"/math",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"host", b"127.0.0.1:8000")],
+    "client": ("127.0.0.1", 50000),
+    "server": ("127.0.0.1", 8000),
+    "subprotocols": [],
+}
+CONNECT = {"type": "websocket.connect"}
+DISCONNECT = {"type": "websocket.disconnect", "code": 1000}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--budget", type=int, default=16384,
+                        help="maximum heap bytes per idle session")
+    parser.add_argument("--top", type=int, default=0, metavar="N",
+                        help="also list the N source files holding the most memory per session")
+    args = parser.parse_args()
+
+    hang_up = asyncio.get_running_loop().create_future()
+    opened = asyncio.Semaphore(0)
+
+    async def send(message):
+        if message["type"] == "websocket.send":
+            opened.release()
+
+    def session():
+        connected = False
+
+        async def receive():
+            nonlocal connected
+            if not connected:
+                connected = True
+                return CONNECT
+            await hang_up
+            return DISCONNECT
+
+        return app(dict(SCOPE), receive, send)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    tasks = [asyncio.ensure_future(session()) for _ in range(args.sessions)]
+    for _ in range(args.sessions):
+        await opened.acquire()
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    stats = after.compare_to(before, "filename")
+    heap = sum(stat.size_diff for stat in stats)
+    report = math_sessions.memory_report()
+    tracemalloc.stop()
+
+    hang_up.set_result(None)
+    await asyncio.gather(*tasks)
+
+    per_session = heap / args.sessions
+    report["heap_bytes_per_session"] = round(per_session)
+    report["budget_bytes_per_session"] = args.budget
+    print(json.dumps(report, indent=2))
+    for stat in stats[:args.top]:
+        print(f"{stat.size_diff / args.sessions:8.0f} B/session  {stat.traceback[0].filename}")
+
+    if math_sessions.active != 0:
+        sys.exit(f"FAIL: {math_sessions.active} session slot(s) leaked")
+    if per_session > args.budget:
+        sys.exit(f"FAIL: {per_session:.0f} bytes per session exceeds the budget of {args.budget}")
+    print(f"OK: {per_session:.0f} bytes per idle session")
+
+if __name__ == "__main__":
+    asyncio.run(main())
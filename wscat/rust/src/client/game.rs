@@ -21,7 +21,7 @@ async fn handle_initial_problem(
     
     let answer: i32 = input.trim().parse().map_err(|_| "Please enter a valid number!")?;
     
-    let solution = MathSolution { answer };
+    let solution = MathSolution { answer, ..Default::default() };
     let solution_bytes = solution.encode_to_vec();
     ws_sender.send(WsMessage::Binary(solution_bytes.into())).await?;
     
@@ -52,7 +52,7 @@ async fn handle_response(
             
             let answer: i32 = input.trim().parse().map_err(|_| "Please enter a valid number!")?;
             
-            let solution = MathSolution { answer };
+            let solution = MathSolution { answer, ..Default::default() };
             let solution_bytes = solution.encode_to_vec();
             ws_sender.send(WsMessage::Binary(solution_bytes.into())).await?;
             
@@ -15,6 +15,7 @@ fn generate_math_problem() -> MathProblem {
     MathProblem {
         a: rng.random_range(1..20),
         b: rng.random_range(1..20),
+        ..Default::default()
     }
 }
 
@@ -71,6 +72,7 @@ async fn handle_socket(mut socket: WebSocket) {
                         response_type: Some(wscat_rust::proto::math_response::ResponseType::Congratulations(
                             "Congratulations! Correct answer!".to_string()
                         )),
+                        ..Default::default()
                     };
                     let response_bytes = response.encode_to_vec();
                     
@@ -88,6 +90,7 @@ async fn handle_socket(mut socket: WebSocket) {
                         response_type: Some(wscat_rust::proto::math_response::ResponseType::NewProblem(
                             problem.clone()
                         )),
+                        ..Default::default()
                     };
                     let response_bytes = response.encode_to_vec();
                     
@@ -125,11 +128,14 @@ async fn main() {
         .route("/add", post(add_handler))
         .route("/math", get(websocket_handler));
 
-    let listener = tokio::net::TcpListener::bind("127.0.0.1:8000")
+    let addr = std::env::args()
+        .nth(1)
+        .unwrap_or_else(|| "127.0.0.1:8000".to_string());
+    let listener = tokio::net::TcpListener::bind(&addr)
         .await
         .unwrap();
     
-    println!("Server running on http://127.0.0.1:8000");
+    println!("Server running on http://{}", addr);
     println!("POST to /add for addition, WebSocket at /math for math game");
     
     axum::serve(listener, app).await.unwrap();